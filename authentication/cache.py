@@ -0,0 +1,411 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from authentication.metrics import registry
+
+
+class SessionCache:
+    """
+    LRU-кеш аутентифицированных сессий внутри процесса (ключ - дайджест токена).
+    Записи живут не дольше ttl секунд и не дольше самой сессии. Запись хранит
+    версии пользователя и роли из общего кеша (если он подключен), по ним
+    get_cached_session сверяет запись с отзывами, сделанными в других воркерах.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._user_tokens = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, token_digest):
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(token_digest)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            user, deadline, versions = entry
+            if deadline <= time.monotonic():
+                self._remove(token_digest)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token_digest)
+            self.hits += 1
+            return user, versions
+
+    def set(self, token_digest, user, expires_at, versions=None):
+        if not self.enabled:
+            return
+
+        ttl = min(self.ttl, (expires_at - timezone.now()).total_seconds())
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            if token_digest in self._entries:
+                self._remove(token_digest)
+            self._entries[token_digest] = (user, time.monotonic() + ttl, versions)
+            self._user_tokens.setdefault(user.pk, set()).add(token_digest)
+
+            while len(self._entries) > self.max_size:
+                oldest_token = next(iter(self._entries))
+                self._remove(oldest_token)
+                self.evictions += 1
+
+    def invalidate(self, token_digest):
+        with self._lock:
+            if token_digest in self._entries:
+                self._remove(token_digest)
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token_digest in list(self._user_tokens.get(user_id, ())):
+                self._remove(token_digest)
+                self.invalidations += 1
+
+    def invalidate_role(self, role_id):
+        with self._lock:
+            tokens = [
+                token_digest for token_digest, (user, _, _) in self._entries.items()
+                if user.role_id == role_id
+            ]
+            for token_digest in tokens:
+                self._remove(token_digest)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._user_tokens.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def _remove(self, token_digest):
+        user, _, _ = self._entries.pop(token_digest)
+        tokens = self._user_tokens.get(user.pk)
+        if tokens is not None:
+            tokens.discard(token_digest)
+            if not tokens:
+                del self._user_tokens[user.pk]
+
+
+class SharedSessionCache:
+    """
+    Общий для всех воркеров кеш сессий поверх Django CACHES.
+    Хранится только принципал (id, email, роль, is_active), не модель целиком.
+    Запись хранит версии пользователя и роли, прочитанные до запроса к БД;
+    смена роли или деактивация поднимает версию, и старая запись перестает читаться.
+    """
+
+    key_prefix = 'auth'
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @property
+    def enabled(self):
+        return bool(self.alias) and self.ttl > 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, token_digest):
+        if not self.enabled:
+            return None
+
+        key = self._session_key(token_digest)
+        entry = self.cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        principal, expires_at, user_version, role_version = entry
+        versions = (user_version, role_version)
+        if not self.is_current(principal[0], principal[2], versions):
+            self.cache.delete(key)
+            self.stale += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return _principal_user(principal), expires_at, versions
+
+    def set(self, token_digest, user, expires_at, versions):
+        """versions - результат current_versions(), прочитанный до запроса к БД"""
+        if not self.enabled or versions is None:
+            return
+
+        timeout = int(min(self.ttl, (expires_at - timezone.now()).total_seconds()))
+        if timeout <= 0:
+            return
+
+        self.cache.set(
+            self._session_key(token_digest),
+            (user.principal(), expires_at, *versions),
+            timeout
+        )
+
+    async def aget(self, token_digest):
+        if not self.enabled:
+            return None
+
+        key = self._session_key(token_digest)
+        entry = await self.cache.aget(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        principal, expires_at, user_version, role_version = entry
+        versions = (user_version, role_version)
+        if not await self.ais_current(principal[0], principal[2], versions):
+            await self.cache.adelete(key)
+            self.stale += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return _principal_user(principal), expires_at, versions
+
+    async def aset(self, token_digest, user, expires_at, versions):
+        if not self.enabled or versions is None:
+            return
+
+        timeout = int(min(self.ttl, (expires_at - timezone.now()).total_seconds()))
+        if timeout <= 0:
+            return
+
+        await self.cache.aset(
+            self._session_key(token_digest),
+            (user.principal(), expires_at, *versions),
+            timeout
+        )
+
+    def current_versions(self, user_id, role_id):
+        if not self.enabled:
+            return None
+        keys = (self._user_version_key(user_id), self._role_version_key(role_id))
+        current = self.cache.get_many(keys)
+        return tuple(current[key] if key in current else self._current_version(key) for key in keys)
+
+    async def acurrent_versions(self, user_id, role_id):
+        if not self.enabled:
+            return None
+        keys = (self._user_version_key(user_id), self._role_version_key(role_id))
+        current = await self.cache.aget_many(keys)
+        return tuple([
+            current[key] if key in current else await self._acurrent_version(key) for key in keys
+        ])
+
+    def is_current(self, user_id, role_id, versions):
+        """Не поднимались ли версии пользователя и роли с момента чтения versions"""
+        user_key = self._user_version_key(user_id)
+        role_key = self._role_version_key(role_id)
+        current = self.cache.get_many([user_key, role_key])
+        return (current.get(user_key), current.get(role_key)) == versions
+
+    async def ais_current(self, user_id, role_id, versions):
+        user_key = self._user_version_key(user_id)
+        role_key = self._role_version_key(role_id)
+        current = await self.cache.aget_many([user_key, role_key])
+        return (current.get(user_key), current.get(role_key)) == versions
+
+    def invalidate(self, token_digest):
+        if self.enabled:
+            self.cache.delete(self._session_key(token_digest))
+
+    def invalidate_many(self, token_digests):
+        if self.enabled and token_digests:
+            self.cache.delete_many([self._session_key(digest) for digest in token_digests])
+
+    def invalidate_user(self, user_id):
+        if self.enabled:
+            self._bump_version(self._user_version_key(user_id))
+
+    def invalidate_role(self, role_id):
+        if self.enabled:
+            self._bump_version(self._role_version_key(role_id))
+
+    def invalidate_users(self, user_ids):
+        """Поднимает версии нескольких пользователей одним set_many вместо incr на каждого"""
+        if self.enabled and user_ids:
+            # Новое значение - текущее время: оно больше любой прежней версии этих ключей
+            version = time.time_ns()
+            self.cache.set_many(
+                {self._user_version_key(user_id): version for user_id in user_ids}, self.version_ttl
+            )
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+        }
+
+    @property
+    def version_ttl(self):
+        # Ключ версии живет дольше любой записи сессии; истекший ключ создается заново
+        # с новым значением, и записи со старой версией просто перестают читаться
+        return self.ttl * 2
+
+    def _current_version(self, key):
+        version = self.cache.get(key)
+        if version is None:
+            # Версии инициализируются временем, чтобы вытесненный ключ версии
+            # не вернулся к старому значению и не оживил устаревшие записи
+            self.cache.add(key, time.time_ns(), self.version_ttl)
+            version = self.cache.get(key)
+        return version
+
+    async def _acurrent_version(self, key):
+        version = await self.cache.aget(key)
+        if version is None:
+            await self.cache.aadd(key, time.time_ns(), self.version_ttl)
+            version = await self.cache.aget(key)
+        return version
+
+    def _bump_version(self, key):
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, time.time_ns(), self.version_ttl)
+
+    def _session_key(self, token_digest):
+        return f'{self.key_prefix}:session:{token_digest.hex()}'
+
+    def _user_version_key(self, user_id):
+        return f'{self.key_prefix}:user-version:{user_id}'
+
+    def _role_version_key(self, role_id):
+        return f'{self.key_prefix}:role-version:{role_id}'
+
+
+session_cache = SessionCache(
+    max_size=settings.AUTH_SESSION_CACHE_SIZE,
+    ttl=settings.AUTH_SESSION_CACHE_TTL
+)
+
+shared_session_cache = SharedSessionCache(
+    alias=settings.AUTH_SHARED_CACHE_ALIAS,
+    ttl=settings.AUTH_SHARED_CACHE_TTL
+)
+
+registry.register_stats('auth_session_cache', 'In-process session cache', session_cache.stats)
+registry.register_stats('auth_shared_session_cache', 'Shared session cache', shared_session_cache.stats)
+
+
+def _principal_user(principal):
+    from authentication.models import User  # models импортирует этот модуль
+
+    return User.from_principal(*principal)
+
+
+def get_cached_session(token_digest):
+    entry = session_cache.get(token_digest)
+    if entry is not None:
+        user, versions = entry
+        # Без общего кеша локальная запись не узнает об отзыве в другом воркере до истечения ttl
+        if not shared_session_cache.enabled or shared_session_cache.is_current(
+                user.pk, user.role_id, versions):
+            return user
+        session_cache.invalidate(token_digest)
+
+    result = shared_session_cache.get(token_digest)
+    if result is None:
+        return None
+
+    user, expires_at, versions = result
+    session_cache.set(token_digest, user, expires_at, versions)
+    return user
+
+
+async def aget_cached_session(token_digest):
+    entry = session_cache.get(token_digest)
+    if entry is not None:
+        user, versions = entry
+        if not shared_session_cache.enabled or await shared_session_cache.ais_current(
+                user.pk, user.role_id, versions):
+            return user
+        session_cache.invalidate(token_digest)
+
+    result = await shared_session_cache.aget(token_digest)
+    if result is None:
+        return None
+
+    user, expires_at, versions = result
+    session_cache.set(token_digest, user, expires_at, versions)
+    return user
+
+
+def cache_session(token_digest, user, expires_at, versions):
+    # С общим кешем запись без версий, прочитанных до запроса к БД, не сохраняется
+    if shared_session_cache.enabled and versions is None:
+        return
+    shared_session_cache.set(token_digest, user, expires_at, versions)
+    session_cache.set(token_digest, user, expires_at, versions)
+
+
+async def acache_session(token_digest, user, expires_at, versions):
+    if shared_session_cache.enabled and versions is None:
+        return
+    await shared_session_cache.aset(token_digest, user, expires_at, versions)
+    session_cache.set(token_digest, user, expires_at, versions)
+
+
+def evict_sessions(token_digests, user_ids, role_id=None):
+    # Версии поднимаются, чтобы локальные записи других воркеров не прошли сверку.
+    # При отзыве по роли хватает одной версии роли вместо версии каждого пользователя
+    for token_digest in token_digests:
+        session_cache.invalidate(token_digest)
+    shared_session_cache.invalidate_many(token_digests)
+    if role_id is not None:
+        shared_session_cache.invalidate_role(role_id)
+    else:
+        shared_session_cache.invalidate_users(set(user_ids))
+
+
+def evict_user_sessions(user_id):
+    session_cache.invalidate_user(user_id)
+    shared_session_cache.invalidate_user(user_id)
+
+
+def evict_role_sessions(role_id):
+    session_cache.invalidate_role(role_id)
+    shared_session_cache.invalidate_role(role_id)
@@ -1,27 +1,45 @@
+from asgiref.sync import iscoroutinefunction
 from django.http import JsonResponse
 from functools import wraps
 
 
+def authenticate_request(request):
+    auth_user = getattr(request, '_authenticated_user', None)
+    if not auth_user:
+        return JsonResponse(
+            {
+                'error': 'Authentication required',
+                'detail': getattr(request, 'auth_error', 'No valid token provided')
+            },
+            status=401
+        )
+    
+    if not auth_user.is_active:
+        return JsonResponse(
+            {'error': 'Account is deactivated'},
+            status=401
+        )
+    
+    request.user = auth_user
+    return None
+
+
 def require_auth(view_func):
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            error_response = authenticate_request(request)
+            if error_response:
+                return error_response
+            return await view_func(request, *args, **kwargs)
+
+        return async_wrapper
+
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        auth_user = getattr(request, '_authenticated_user', None)
-        if not auth_user:
-            return JsonResponse(
-                {
-                    'error': 'Authentication required',
-                    'detail': getattr(request, 'auth_error', 'No valid token provided')
-                },
-                status=401
-            )
-        
-        if not auth_user.is_active:
-            return JsonResponse(
-                {'error': 'Account is deactivated'},
-                status=401
-            )
-        
-        request.user = auth_user
+        error_response = authenticate_request(request)
+        if error_response:
+            return error_response
         return view_func(request, *args, **kwargs)
     
-    return wrapper
\ No newline at end of file
+    return wrapper
@@ -0,0 +1,55 @@
+import logging
+import random
+
+from django.conf import settings
+
+from authentication.metrics import registry
+from authentication.throttling import TokenBucket
+
+
+logger = logging.getLogger('authentication.events')
+
+AUTH_EVENTS = registry.counter(
+    'auth_events_total',
+    'Auth events by name and result (logged, sampled_out, rate_limited)',
+    ('event', 'result')
+)
+
+# Лимит на тип события, а не на клиента: сканер не может заполнить лог
+_limiter = TokenBucket(settings.AUTH_EVENT_RATE_LIMIT, max_keys=1000)
+
+
+def log_auth_event(event, request=None, level=logging.INFO, **fields):
+    """
+    Структурированное событие аутентификации/авторизации. Решение о записи
+    (sampling, лимит) принимается до построения записи; сама запись уходит
+    в очередь NonBlockingHandler без ввода-вывода в потоке запроса.
+    """
+    if not logger.isEnabledFor(level):
+        return
+
+    sample_rate = settings.AUTH_EVENT_SAMPLE_RATES.get(event, 1.0)
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        AUTH_EVENTS.inc(event, 'sampled_out')
+        return
+
+    if _limiter.consume(event):
+        AUTH_EVENTS.inc(event, 'rate_limited')
+        return
+
+    AUTH_EVENTS.inc(event, 'logged')
+    if request is not None:
+        fields.setdefault('ip', request.META.get('REMOTE_ADDR'))
+        fields.setdefault('method', request.method)
+        fields.setdefault('path', request.path)
+    if sample_rate < 1.0:
+        fields['sample_rate'] = sample_rate
+    logger.log(level, event, extra=fields)
+
+
+def _handler_stats():
+    dropped = sum(getattr(handler, 'dropped', 0) for handler in logger.handlers)
+    return {'dropped': dropped}
+
+
+registry.register_stats('auth_event_log', 'Auth event records dropped on a full queue', _handler_stats)
@@ -0,0 +1,107 @@
+from functools import lru_cache
+
+import bcrypt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from argon2 import PasswordHasher as Argon2PasswordHasher, Type as Argon2Type
+    from argon2.exceptions import InvalidHashError, VerificationError
+except ImportError:
+    Argon2PasswordHasher = None
+
+
+class BCryptHasher:
+    algorithm = 'bcrypt'
+    prefixes = ('$2a$', '$2b$', '$2y$')
+
+    def __init__(self, rounds):
+        self.rounds = rounds
+
+    def matches(self, encoded):
+        return encoded.startswith(self.prefixes)
+
+    def hash(self, password):
+        return bcrypt.hashpw(
+            password.encode('utf-8'),
+            bcrypt.gensalt(rounds=self.rounds)
+        ).decode('utf-8')
+
+    def verify(self, password, encoded):
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), encoded.encode('utf-8'))
+        except ValueError:
+            return False
+
+    def needs_rehash(self, encoded):
+        # Формат: $2b$<rounds>$<salt+hash>
+        return int(encoded.split('$')[2]) != self.rounds
+
+
+class Argon2idHasher:
+    algorithm = 'argon2id'
+    prefixes = ('$argon2id$',)
+
+    def __init__(self, time_cost, memory_cost, parallelism):
+        if Argon2PasswordHasher is None:
+            raise ImproperlyConfigured('argon2id password hashing requires the argon2-cffi package')
+        self._hasher = Argon2PasswordHasher(
+            time_cost=time_cost,
+            memory_cost=memory_cost,
+            parallelism=parallelism,
+            type=Argon2Type.ID
+        )
+
+    def matches(self, encoded):
+        return encoded.startswith(self.prefixes)
+
+    def hash(self, password):
+        return self._hasher.hash(password)
+
+    def verify(self, password, encoded):
+        try:
+            return self._hasher.verify(encoded, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    def needs_rehash(self, encoded):
+        return self._hasher.check_needs_rehash(encoded)
+
+
+@lru_cache(maxsize=None)
+def get_hasher(algorithm):
+    if algorithm == 'bcrypt':
+        return BCryptHasher(rounds=settings.BCRYPT_ROUNDS)
+    if algorithm == 'argon2id':
+        return Argon2idHasher(
+            time_cost=settings.ARGON2_TIME_COST,
+            memory_cost=settings.ARGON2_MEMORY_COST,
+            parallelism=settings.ARGON2_PARALLELISM
+        )
+    raise ImproperlyConfigured(f'Unknown password hasher "{algorithm}"')
+
+
+def identify_hasher(encoded):
+    for hasher_class in (BCryptHasher, Argon2idHasher):
+        if encoded.startswith(hasher_class.prefixes):
+            return get_hasher(hasher_class.algorithm)
+    return None
+
+
+def make_password(password):
+    return get_hasher(settings.PASSWORD_HASHER).hash(password)
+
+
+def check_password(password, encoded):
+    hasher = identify_hasher(encoded or '')
+    if hasher is None:
+        return False
+    return hasher.verify(password, encoded)
+
+
+def needs_rehash(encoded):
+    # Хеш устарел, если сменился алгоритм или его параметры стоимости
+    preferred = get_hasher(settings.PASSWORD_HASHER)
+    if not preferred.matches(encoded):
+        return True
+    return preferred.needs_rehash(encoded)
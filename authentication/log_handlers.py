@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, событие и поля из extra"""
+
+    reserved = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message'}
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.reserved:
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class NonBlockingHandler(QueueHandler):
+    """
+    Запись уходит в ограниченную очередь, форматирование и вывод в stream
+    выполняет отдельный поток. Если очередь переполнена, запись отбрасывается,
+    а не блокирует запрос.
+    Поток запускается при первой записи в текущем процессе: после fork воркера
+    (gunicorn --preload) потока родителя в нем нет.
+    """
+
+    def __init__(self, queue_size=10000, stream=None):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream)
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # Форматирует поток-слушатель, а не поток запроса
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_listener(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Очередь, унаследованная от родителя, могла остаться с его замками и записями
+            self.queue = queue.Queue(maxsize=self.queue_size)
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def close(self):
+        # logging.shutdown() при выходе закрывает обработчики: оставшиеся записи дописываются
+        with self._start_lock:
+            if self._pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self._pid = None
+        super().close()
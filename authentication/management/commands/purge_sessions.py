@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.models import Session
+from authentication.reaper import SessionReaper
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие сессии пачками (однократно или каждые --interval секунд)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Не завершаться, а повторять очистку каждые N секунд'
+        )
+
+    def handle(self, *args, **options):
+        if options['interval']:
+            reaper = SessionReaper(interval=options['interval'], batch_size=options['batch_size'])
+            try:
+                reaper.run()
+            except KeyboardInterrupt:
+                reaper.stop()
+            return
+
+        started = time.monotonic()
+        deleted = Session.purge_expired(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'Deleted {deleted} expired sessions in {elapsed:.2f}s')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from authentication.models import Session
+from authorization.models import Role
+
+
+class Command(BaseCommand):
+    help = 'Отзывает сессии по пользователям, роли, окну создания или IP одним DELETE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='ID пользователя (можно несколько)')
+        parser.add_argument('--role', help='Название роли (в API /api/admin/sessions/revoke/ роль задается id)')
+        parser.add_argument('--created-after', help='ISO-время, включительно')
+        parser.add_argument('--created-before', help='ISO-время, не включительно')
+        parser.add_argument('--ip', dest='ip_address')
+
+    def handle(self, *args, **options):
+        role_id = None
+        if options['role']:
+            role_id = Role.objects.filter(name=options['role']).values_list('id', flat=True).first()
+            if role_id is None:
+                raise CommandError(f'Role "{options["role"]}" not found')
+
+        criteria = {
+            'user_ids': options['user_ids'],
+            'role_id': role_id,
+            'created_after': self._parse_time(options['created_after']),
+            'created_before': self._parse_time(options['created_before']),
+            'ip_address': options['ip_address'],
+        }
+        if not any(criteria.values()):
+            raise CommandError('At least one filter is required')
+
+        revoked = Session.objects.matching(**criteria).revoke(role_id=role_id)
+        self.stdout.write(f'Revoked {revoked} sessions')
+
+    def _parse_time(self, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f'Invalid datetime "{value}"')
+        return parsed
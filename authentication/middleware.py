@@ -1,40 +1,114 @@
+import time
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.http import JsonResponse
-from django.utils.deprecation import MiddlewareMixin
+from authentication.cache import (
+    acache_session,
+    aget_cached_session,
+    cache_session,
+    get_cached_session,
+    session_cache,
+    shared_session_cache
+)
+from authentication.events import log_auth_event
+from authentication.metrics import registry
 from authentication.models import User, Session
+from authorization.models import Role
+from authorization.policy import policy_store
 from django.utils import timezone
 
 
-class CustomAuthMiddleware(MiddlewareMixin):
+AUTH_REQUESTS = registry.counter(
+    'auth_requests_total',
+    'Requests seen by CustomAuthMiddleware by outcome (authenticated, invalid, anonymous)',
+    ('outcome',)
+)
+AUTH_TOKEN_SECONDS = registry.histogram(
+    'auth_token_seconds',
+    'Bearer token authentication latency',
+    ('outcome',)
+)
+
+
+def _observe_authentication(user, started):
+    outcome = 'authenticated' if user else 'invalid'
+    AUTH_REQUESTS.inc(outcome)
+    AUTH_TOKEN_SECONDS.observe(time.perf_counter() - started, outcome)
+
+
+class CustomAuthMiddleware:
+    # Работает и под WSGI, и под ASGI: в async-цепочке Django не оборачивает
+    # middleware в sync_to_async, а запросы к БД и кешу идут через async API
+    sync_capable = True
+    async_capable = True
+
+    public_paths = (
+        '/api/auth/register/',
+        '/api/auth/login/',
+        '/admin/',
+        '/metrics',
+    )
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        await self.aprocess_request(request)
+        return await self.get_response(request)
 
     def process_request(self, request):
-        
-        public_paths = [
-            '/api/auth/register/',
-            '/api/auth/login/',
-            '/admin/',
-        ]
-
-        if any(request.path.startswith(path) for path in public_paths):
+        token = self._prepare_request(request)
+        if token:
+            started = time.perf_counter()
+            user = self._authenticate_token(token)
+            _observe_authentication(user, started)
+            self._set_user(request, user)
+            if not user:
+                log_auth_event('invalid_token', request)
+
+    async def aprocess_request(self, request):
+        token = self._prepare_request(request)
+        if token:
+            started = time.perf_counter()
+            user = await self._aauthenticate_token(token)
+            _observe_authentication(user, started)
+            self._set_user(request, user)
+            if not user:
+                log_auth_event('invalid_token', request)
+
+    def _prepare_request(self, request):
+        if request.path.startswith(self.public_paths):
             request._authenticated_user = None
             return None
 
         token = self._extract_token(request)
 
         if not token:
-            print("No token")
+            AUTH_REQUESTS.inc('anonymous')
+            log_auth_event('missing_token', request)
             request._authenticated_user = None
             request.auth_error = None
             return None
 
-        user = self._authenticate_token(token)
-        
+        return token
+
+    def _set_user(self, request, user):
         if user:
             request._authenticated_user = user
             request.auth_error = None
         else:
             request._authenticated_user = None
             request.auth_error = "Invalid or expired token"
-        return None
 
     def _extract_token(self, request):
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
@@ -43,18 +117,164 @@ class CustomAuthMiddleware(MiddlewareMixin):
         return None
 
     def _authenticate_token(self, token):
+        token_digest = Session.hash_token(token)
+
+        user = get_cached_session(token_digest)
+        if user is not None:
+            return user
+
+        # Версии читаются до запроса к БД: изменение, закоммиченное позже, поднимет их
+        # и запись с устаревшими данными не пройдет сверку
+        cache_key = self._cache_key(token)
+        versions = shared_session_cache.current_versions(*cache_key) if cache_key else None
+
+        if settings.AUTH_STATELESS_JWT:
+            result = self._authenticate_stateless(token, token_digest)
+        else:
+            result = self._authenticate_session(token_digest)
+
+        if not result:
+            return None
+
+        user, expires_at = result
+        if cache_key == (user.pk, user.role_id):
+            cache_session(token_digest, user, expires_at, versions)
+        return user
+
+    def _cache_key(self, token):
+        # Пользователь и роль из claims выбирают ключи версий, личность определяет сессия в БД.
+        # Подпись проверяется до обращения к кешу: поддельный токен не должен создавать ключи.
+        # Если роль сменилась после входа, ключи не совпадут с найденным пользователем
+        # и запись в кеш не попадет
+        if not session_cache.enabled and not shared_session_cache.enabled:
+            return None
+        try:
+            claims = User.decode_token(token)
+        except jwt.InvalidTokenError:
+            return None
+        user_id, role_id = claims.get('user_id'), claims.get('role_id')
+        if type(user_id) is not int or type(role_id) is not int:
+            return None
+        return user_id, role_id
+
+    def _authenticate_session(self, token_digest):
         try:
             session = Session.objects.select_related('user', 'user__role').filter(
-                session_token=token
+                token_digest=token_digest
             ).first()
 
+            if not session:
+                return None
+
+            # Истекшие сессии удаляет фоновая очистка (purge_sessions), не запрос
+            if not session.is_valid():
+                log_auth_event('session_expired', user_id=session.user_id)
+                return None
+
+            return session.user, session.expires_at
+        except Exception:
+            return None
+
+    def _authenticate_stateless(self, token, token_digest):
+        claims = self._decode_claims(token)
+        if claims is None:
+            return None
+
+        # Подпись и срок проверены локально, в БД остается только проверка отзыва:
+        # сессия не удалена, пользователь активен, роль берется актуальная
+        try:
+            row = next(iter(self._revocation_row(token_digest)), None)
+            if not row or not row[1]:
+                return None
+            role_name = policy_store.get().role_names.get(row[2])
+            if role_name is None:
+                role_name = next(iter(self._role_name(row[2])), None)
+        except Exception:
+            return None
+
+        return self._build_principal(claims, row, role_name)
+
+    def _decode_claims(self, token):
+        try:
+            return User.decode_token(token)
+        except jwt.ExpiredSignatureError:
+            log_auth_event('session_expired')
+        except jwt.InvalidTokenError:
+            pass
+        return None
+
+    def _revocation_row(self, token_digest):
+        # sessions по уникальному дайджесту и users только ради is_active/role_id;
+        # срез [:1] без first() - в запросе нет ORDER BY
+        return Session.objects.filter(
+            token_digest=token_digest,
+            expires_at__gt=timezone.now()
+        ).values_list('expires_at', 'user__is_active', 'user__role_id')[:1]
+
+    def _role_name(self, role_id):
+        # Роль создана после загрузки матрицы прав
+        return Role.objects.filter(pk=role_id).values_list('name', flat=True)[:1]
+
+    def _build_principal(self, claims, row, role_name):
+        expires_at, is_active, role_id = row
+        user = User.from_principal(claims['user_id'], claims['email'], role_id, role_name, is_active)
+        return user, expires_at
+
+    async def _aauthenticate_token(self, token):
+        token_digest = Session.hash_token(token)
+
+        user = await aget_cached_session(token_digest)
+        if user is not None:
+            return user
+
+        cache_key = self._cache_key(token)
+        versions = await shared_session_cache.acurrent_versions(*cache_key) if cache_key else None
+
+        if settings.AUTH_STATELESS_JWT:
+            result = await self._aauthenticate_stateless(token, token_digest)
+        else:
+            result = await self._aauthenticate_session(token_digest)
+
+        if not result:
+            return None
+
+        user, expires_at = result
+        if cache_key == (user.pk, user.role_id):
+            await acache_session(token_digest, user, expires_at, versions)
+        return user
+
+    async def _aauthenticate_session(self, token_digest):
+        try:
+            session = await Session.objects.select_related('user', 'user__role').filter(
+                token_digest=token_digest
+            ).afirst()
+
             if not session:
                 return None
 
             if not session.is_valid():
-                session.delete()
+                log_auth_event('session_expired', user_id=session.user_id)
                 return None
 
-            return session.user
+            return session.user, session.expires_at
         except Exception:
-            return None
\ No newline at end of file
+            return None
+
+    async def _aauthenticate_stateless(self, token, token_digest):
+        claims = self._decode_claims(token)
+        if claims is None:
+            return None
+
+        try:
+            rows = [row async for row in self._revocation_row(token_digest)]
+            row = rows[0] if rows else None
+            if not row or not row[1]:
+                return None
+            role_name = (await policy_store.aget()).role_names.get(row[2])
+            if role_name is None:
+                names = [name async for name in self._role_name(row[2])]
+                role_name = names[0] if names else None
+        except Exception:
+            return None
+
+        return self._build_principal(claims, row, role_name)
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:15
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_session_tokens(apps, schema_editor):
+    Session = apps.get_model('authentication', 'Session')
+    batch = []
+    for session in Session.objects.only('id', 'session_token').iterator(chunk_size=2000):
+        session.token_digest = hashlib.sha256(session.session_token.encode('utf-8')).digest()
+        batch.append(session)
+        if len(batch) >= 2000:
+            Session.objects.bulk_update(batch, ['token_digest'])
+            batch = []
+    if batch:
+        Session.objects.bulk_update(batch, ['token_digest'])
+
+
+def drop_sessions(apps, schema_editor):
+    # Открытые токены не восстановить из дайджестов: при откате все сессии завершаются
+    apps.get_model('authentication', 'Session').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='token_digest',
+            field=models.BinaryField(max_length=32, null=True, verbose_name='SHA-256 токена'),
+        ),
+        migrations.RunPython(hash_session_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='session',
+            name='token_digest',
+            field=models.BinaryField(max_length=32, unique=True, verbose_name='SHA-256 токена'),
+        ),
+        migrations.RemoveField(
+            model_name='session',
+            name='session_token',
+        ),
+        migrations.RunPython(migrations.RunPython.noop, drop_sessions),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_session_token_digest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='session',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, verbose_name='Истекает'),
+        ),
+    ]
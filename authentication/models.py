@@ -1,9 +1,13 @@
-from django.db import models
-import bcrypt
+import hashlib
+import secrets
+from functools import partial
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
 import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.utils import timezone
+from authentication import hashers
+from authentication.cache import cache_session, evict_sessions, session_cache, shared_session_cache
 
 class User(models.Model):
     first_name = models.CharField(max_length=100, verbose_name='Имя')
@@ -25,6 +29,10 @@ class User(models.Model):
 
     class Meta:
         db_table = 'users'
+        indexes = [
+            # Обратный поиск "кто может X": активные пользователи ролей, постранично по id
+            models.Index(fields=['role', 'is_active', 'id'], name='users_role_active_id_idx'),
+        ]
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
 
@@ -32,37 +40,124 @@ class User(models.Model):
         return self.email
 
     def set_password(self, password):
-        salt = bcrypt.gensalt(rounds=12)
-        self.password_hash = bcrypt.hashpw(
-            password.encode('utf-8'), 
-            salt
-        ).decode('utf-8')
+        self.password_hash = hashers.make_password(password)
 
     def check_password(self, password):
-        return bcrypt.checkpw(
-            password.encode('utf-8'), 
-            self.password_hash.encode('utf-8')
-        )
+        password_valid, new_hash = self.verify_password(password)
+        if new_hash:
+            self.update_password_hash(new_hash)
+        return password_valid
+
+    def verify_password(self, password):
+        # Только вычисления, без БД (выполняется в пуле потоков): (пароль верен, новый хеш или None).
+        # Новый хеш считается, если алгоритм или стоимость хеша устарели
+        if not hashers.check_password(password, self.password_hash):
+            return False, None
+        if hashers.needs_rehash(self.password_hash):
+            return True, hashers.make_password(password)
+        return True, None
+
+    def update_password_hash(self, password_hash):
+        self.password_hash = password_hash
+        # update() без сигналов: смена хеша не должна сбрасывать кеш сессий
+        User.objects.filter(pk=self.pk).update(password_hash=password_hash)
     
     def generate_token(self):
         payload = {
             'user_id': self.id,
             'email': self.email,
             'role_id': self.role_id,
-            'exp': datetime.utcnow() + timedelta(hours=24),
-            'iat': datetime.utcnow()
+            'exp': datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRATION_HOURS),
+            'iat': datetime.utcnow(),
+            # Уникальный id токена: параллельные входы в одну секунду дают разные токены
+            'jti': secrets.token_urlsafe(16)
         }
-        token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+        token = jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
         return token
 
+    @staticmethod
+    def decode_token(token):
+        # Проверяет подпись и срок действия, выбрасывает jwt.InvalidTokenError
+        return jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+
+    def principal(self):
+        # Минимум для аутентификации и проверки прав; в общий кеш попадает только он
+        return self.pk, self.email, self.role_id, self.role.name, self.is_active
+
+    @classmethod
+    def from_principal(cls, user_id, email, role_id, role_name, is_active):
+        user = cls.from_db(
+            DEFAULT_DB_ALIAS,
+            ['id', 'email', 'role_id', 'is_active'],
+            [user_id, email, role_id, is_active]
+        )
+        role_model = cls._meta.get_field('role').related_model
+        user.role = role_model.from_db(DEFAULT_DB_ALIAS, ['id', 'name'], [role_id, role_name])
+        return user
+
+    def load_profile(self):
+        # Принципал из JWT содержит только поля из claims, остальное догружаем одним запросом
+        deferred_fields = self.get_deferred_fields()
+        if deferred_fields:
+            self.refresh_from_db(fields=deferred_fields)
+        return self
+
+class SessionQuerySet(models.QuerySet):
+
+    def matching(self, user_ids=None, role_id=None, created_after=None, created_before=None, ip_address=None):
+        sessions = self
+        if user_ids:
+            sessions = sessions.filter(user_id__in=user_ids)
+        if role_id:
+            sessions = sessions.filter(user__role_id=role_id)
+        if created_after:
+            sessions = sessions.filter(created_at__gte=created_after)
+        if created_before:
+            sessions = sessions.filter(created_at__lt=created_before)
+        if ip_address:
+            sessions = sessions.filter(ip_address=ip_address)
+        return sessions
+
+    def revoke(self, role_id=None):
+        """
+        Удаляет сессии одним DELETE ... RETURNING (PostgreSQL, SQLite 3.35+): из кешей
+        вычищаются ровно удаленные строки, в том числе созданные параллельно с отзывом.
+        role_id - роль, по которой отобраны сессии: тогда в общем кеше поднимается одна
+        версия роли, а не версия каждого пользователя.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        subquery, params = self.values('pk').query.get_compiler(using=self.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote(self.model._meta.db_table)} WHERE {quote("id")} IN ({subquery}) '
+                f'RETURNING {quote("token_digest")}, {quote("user_id")}',
+                params
+            )
+            rows = cursor.fetchall()
+
+        token_digests = [bytes(digest) for digest, _ in rows]
+        user_ids = [user_id for _, user_id in rows]
+        evict = partial(evict_sessions, token_digests, user_ids, role_id)
+        if connection.in_atomic_block:
+            # До коммита удаленные строки видны другим запросам, и они могут снова попасть
+            # в кеш; вытеснение имеет смысл только после коммита
+            transaction.on_commit(evict, using=self.db)
+        else:
+            evict()
+        return len(rows)
+
+
 class Session(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь')
-    session_token = models.CharField(max_length=500, unique=True, verbose_name='Токен сессии')
-    expires_at = models.DateTimeField(verbose_name='Истекает')
+    token_digest = models.BinaryField(max_length=32, unique=True, verbose_name='SHA-256 токена')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Истекает')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name='IP адрес')
     user_agent = models.TextField(null=True, blank=True, verbose_name='User Agent')
 
+    objects = SessionQuerySet.as_manager()
+
     class Meta:
         db_table = 'sessions'
         verbose_name = 'Сессия'
@@ -71,19 +166,50 @@ class Session(models.Model):
     def __str__(self):
         return f"Session for {self.user.email}"
 
+    @staticmethod
+    def hash_token(token):
+        # В БД хранится только 32-байтный дайджест, сам токен не сохраняется
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
     def is_valid(self):
         return self.expires_at > timezone.now() and self.user.is_active
+
+    @classmethod
+    def purge_expired(cls, batch_size=5000):
+        # Удаляем пачками по индексу expires_at, чтобы не держать длинные блокировки
+        now = timezone.now()
+        deleted = 0
+        while True:
+            ids = list(
+                cls.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted += cls.objects.filter(id__in=ids).delete()[0]
+            if len(ids) < batch_size:
+                break
+        return deleted
     
     @classmethod
     def create_session(cls, user, ip_address=None, user_agent=None):
         token = user.generate_token()
-        expires_at = timezone.now() + timedelta(hours=24)
-        
+        token_digest = cls.hash_token(token)
+        expires_at = timezone.now() + timedelta(hours=settings.JWT_EXPIRATION_HOURS)
+        # Версии читаются до записи сессии, как в middleware до запроса к БД
+        versions = shared_session_cache.current_versions(user.pk, user.role_id)
+
         session = cls.objects.create(
             user=user,
-            session_token=token,
+            token_digest=token_digest,
             expires_at=expires_at,
             ip_address=ip_address,
             user_agent=user_agent
         )
+        # Пользователь загружен раньше, чем прочитаны версии: смена роли или деактивация
+        # в этом промежутке не сделала бы запись устаревшей, поэтому она проверяется по БД
+        if (session_cache.enabled or shared_session_cache.enabled) and User.objects.filter(
+                pk=user.pk, role_id=user.role_id, role__name=user.role.name, is_active=True).exists():
+            cache_session(token_digest, user, expires_at, versions)
+        # Открытый токен доступен только вызывающему коду, чтобы вернуть его клиенту
+        session.token = token
         return session
\ No newline at end of file
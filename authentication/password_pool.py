@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from authentication.metrics import registry
+
+
+class PasswordPoolFull(Exception):
+    pass
+
+
+class PasswordCheckPool:
+    """
+    Ограниченный пул потоков для проверки паролей вне event loop.
+    bcrypt отпускает GIL, поэтому потоки работают параллельно, а лимит
+    очереди не дает шторму логинов занять ресурсы остального трафика.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+
+    async def check_password(self, user, password):
+        """
+        (пароль верен, новый хеш или None). В потоках пула только хеширование:
+        соединения с БД там не открываются, перехеш сохраняет вызывающий код.
+        """
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordPoolFull()
+            self.pending += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.pending - self.running)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._get_executor(), self._run, user.verify_password, password
+            )
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': self.running,
+                'queue_depth': max(self.pending - self.running, 0),
+                'max_queue_depth': self.max_queue_depth,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+    def _run(self, func, *args):
+        with self._lock:
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='password-check'
+                    )
+        return self._executor
+
+
+password_pool = PasswordCheckPool(
+    max_workers=settings.LOGIN_HASH_WORKERS,
+    max_queue=settings.LOGIN_HASH_QUEUE_SIZE
+)
+
+registry.register_stats('auth_password_pool', 'Password check thread pool', password_pool.stats)
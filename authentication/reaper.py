@@ -0,0 +1,44 @@
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+
+from authentication.models import Session
+
+logger = logging.getLogger(__name__)
+
+
+class SessionReaper:
+    """
+    Периодически удаляет истекшие сессии. Запускается явно в одном процессе
+    (manage.py purge_sessions --interval), а не в каждом воркере.
+    """
+
+    def __init__(self, interval, batch_size):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_deleted = 0
+        self.last_duration = 0.0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.purge()
+
+    def purge(self):
+        started = time.monotonic()
+        try:
+            self.last_deleted = Session.purge_expired(batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Expired session purge failed')
+            return
+        finally:
+            close_old_connections()
+        self.last_duration = time.monotonic() - started
+        logger.info(
+            'Deleted %d expired sessions in %.2fs', self.last_deleted, self.last_duration
+        )
+
+    def stop(self):
+        self._stopped.set()
@@ -40,23 +40,10 @@ class UserLoginSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
     password = serializers.CharField(write_only=True, required=True)
     
-    def validate(self, data):
-        email = data.get('email', '').lower()
-        password = data.get('password', '')
-        
-        try:
-            user = User.objects.select_related('role').get(email=email)
-        except User.DoesNotExist:
-            raise serializers.ValidationError("Неверный email или пароль")
-        
-        if not user.is_active:
-            raise serializers.ValidationError("Аккаунт деактивирован")
-        
-        if not user.check_password(password):
-            raise serializers.ValidationError("Неверный email или пароль")
-        
-        data['user'] = user
-        return data
+    # Поиск пользователя и проверка пароля выполняются в login_view асинхронно,
+    # здесь только валидация полей, без обращений к БД
+    def validate_email(self, value):
+        return value.lower()
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -0,0 +1,26 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from authentication.cache import evict_role_sessions, evict_user_sessions
+from authentication.models import User
+from authorization.models import Role
+
+
+# Кеш очищается сразу и еще раз после коммита: запрос, прочитавший из БД
+# незакоммиченное старое состояние, не оставит в кеше запись со свежей версией
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    evict_user_sessions(instance.pk)
+    transaction.on_commit(partial(evict_user_sessions, instance.pk))
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def role_changed(sender, instance, **kwargs):
+    evict_role_sessions(instance.pk)
+    transaction.on_commit(partial(evict_role_sessions, instance.pk))
@@ -1,3 +1,462 @@
-from django.test import TestCase
+import json
+import logging
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+import jwt
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from authentication import events, hashers
+from authentication.cache import get_cached_session, session_cache, shared_session_cache
+from authentication.events import AUTH_EVENTS, log_auth_event
+from authentication.log_handlers import JsonFormatter, NonBlockingHandler
+from authentication.metrics import MetricsRegistry
+from authentication.middleware import CustomAuthMiddleware
+from authentication.models import Session, User
+from authentication.password_pool import password_pool
+from authentication.throttling import TokenBucket, login_throttle
+from authorization.models import Role
+from authorization.policy import policy_store
+
+
+def create_user(email, role, password=None):
+    user = User(email=email, first_name='Test', last_name='User', role=role)
+    if password:
+        user.set_password(password)
+    user.save()
+    return user
+
+
+@override_settings(AUTH_STATELESS_JWT=True)
+class StatelessAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user@example.com', Role.objects.create(name='user'))
+
+    def setUp(self):
+        policy_store.invalidate()
+        self.token = Session.create_session(self.user).token
+
+    def me(self, token):
+        return self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_valid_token(self):
+        response = self.me(self.token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['role'], 'user')
+
+    def test_revocation_check_reads_sessions_and_users_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.me(self.token)
+        session_queries = [
+            query['sql'] for query in queries.captured_queries if 'FROM "sessions"' in query['sql']
+        ]
+        self.assertEqual(len(session_queries), 1)
+        self.assertNotIn('ORDER BY', session_queries[0])
+        self.assertNotIn('"roles"', session_queries[0])
+
+    def test_revoked_session(self):
+        Session.objects.filter(user=self.user).delete()
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+    def test_inactive_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+    def test_bad_signature(self):
+        claims = User.decode_token(self.token)
+        forged = jwt.encode(claims, 'another-secret', algorithm=settings.JWT_ALGORITHM)
+        self.assertEqual(self.me(forged).status_code, 401)
+
+    def test_database_error(self):
+        with mock.patch.object(Session.objects, 'filter', side_effect=DatabaseError('connection lost')):
+            self.assertEqual(self.me(self.token).status_code, 401)
+
+
+class CachedSessionTestCase(TestCase):
+    # Оба кеша включены: локальный LRU и общий поверх CACHES['default']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user('admin@example.com', Role.objects.create(name='admin'))
+        cls.user = create_user('user@example.com', Role.objects.create(name='user'))
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(session_cache, 'max_size', 100),
+            mock.patch.object(shared_session_cache, 'alias', 'default'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(session_cache.clear)
+        self.addCleanup(caches['default'].clear)
+
+        self.token = Session.create_session(self.user).token
+
+    def me(self, token):
+        return self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def warm_up(self):
+        self.assertEqual(self.me(self.token).status_code, 200)
+        hits = session_cache.stats()['hits']
+        self.assertEqual(self.me(self.token).status_code, 200)
+        self.assertEqual(session_cache.stats()['hits'], hits + 1)
+
+
+class SessionCacheEvictionTests(CachedSessionTestCase):
+
+    def test_logout_evicts_session(self):
+        self.warm_up()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/logout/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+    def test_revoke_in_another_worker(self):
+        self.warm_up()
+        # Другой воркер удаляет строку и поднимает версию пользователя в общем кеше;
+        # локальная запись этого процесса не проходит сверку версий
+        Session.objects.filter(user=self.user).delete()
+        shared_session_cache.invalidate_user(self.user.pk)
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+    def test_deactivation_evicts_sessions(self):
+        self.warm_up()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+
+class SharedSessionCacheTests(CachedSessionTestCase):
+
+    def test_shared_entry_holds_principal_only(self):
+        self.warm_up()
+        key = shared_session_cache._session_key(Session.hash_token(self.token))
+        principal = caches['default'].get(key)[0]
+        self.assertEqual(principal, (self.user.pk, 'user@example.com', self.user.role_id, 'user', True))
+
+    def test_new_session_is_written_through(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me(self.token).status_code, 200)
+
+    def test_stale_user_is_not_written_through(self):
+        user = User.objects.select_related('role').get(pk=self.user.pk)
+        User.objects.filter(pk=user.pk).update(role=self.admin.role)
+        token = Session.create_session(user).token
+        self.assertIsNone(get_cached_session(Session.hash_token(token)))
+
+    def test_forged_token_creates_no_version_keys(self):
+        claims = {**User.decode_token(self.token), 'user_id': 999, 'role_id': 999}
+        forged = jwt.encode(claims, 'another-secret', algorithm=settings.JWT_ALGORITHM)
+        self.assertEqual(self.me(forged).status_code, 401)
+        keys = [shared_session_cache._user_version_key(999), shared_session_cache._role_version_key(999)]
+        self.assertEqual(caches['default'].get_many(keys), {})
+
+    def test_non_integer_ids_are_not_cache_keys(self):
+        middleware = CustomAuthMiddleware(lambda request: None)
+        claims = {**User.decode_token(self.token), 'user_id': 'x' * 300, 'role_id': 'a b'}
+        token = jwt.encode(claims, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        self.assertIsNone(middleware._cache_key(token))
+        self.assertEqual(middleware._cache_key(self.token), (self.user.pk, self.user.role_id))
+
+
+@override_settings(BCRYPT_ROUNDS=4)
+class AsyncLoginTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        hashers.get_hasher.cache_clear()
+        cls.addClassCleanup(hashers.get_hasher.cache_clear)
+        cls.user = create_user('user@example.com', Role.objects.create(name='user'), 'secret123')
+
+    def setUp(self):
+        patcher = mock.patch.object(login_throttle, '_limiters', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def login(self, password):
+        return await self.async_client.post(
+            '/api/auth/login/', {'email': 'user@example.com', 'password': password},
+            content_type='application/json'
+        )
+
+    async def test_login_returns_token(self):
+        response = await self.login('secret123')
+        self.assertEqual(response.status_code, 200)
+        token_digest = Session.hash_token(response.json()['token'])
+        self.assertTrue(await Session.objects.filter(token_digest=token_digest).aexists())
+
+    async def test_wrong_password(self):
+        response = await self.login('wrong')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await Session.objects.aexists())
+
+    def test_form_login(self):
+        for encode in (True, False):
+            with self.subTest(urlencoded=encode):
+                data = {'email': 'user@example.com', 'password': 'secret123'}
+                if encode:
+                    response = self.client.post(
+                        '/api/auth/login/', urlencode(data), content_type='application/x-www-form-urlencoded'
+                    )
+                else:
+                    response = self.client.post('/api/auth/login/', data)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('token', response.json())
+
+    def test_method_not_allowed(self):
+        response = self.client.get('/api/auth/login/')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'POST')
+
+    async def test_full_pool_rejects_login(self):
+        with mock.patch.object(password_pool, 'max_queue', -password_pool.max_workers):
+            response = await self.login('secret123')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+@override_settings(PASSWORD_HASHER='bcrypt', BCRYPT_ROUNDS=4)
+class VerifyPasswordTests(TestCase):
+
+    def setUp(self):
+        hashers.get_hasher.cache_clear()
+        self.addCleanup(hashers.get_hasher.cache_clear)
+        self.user = create_user('user@example.com', Role.objects.create(name='user'), 'secret123')
+
+    def test_verify_password_does_not_write(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user.verify_password('secret123'), (True, None))
+            self.assertEqual(self.user.verify_password('wrong'), (False, None))
+
+    def test_outdated_hash_is_rehashed(self):
+        with override_settings(BCRYPT_ROUNDS=5):
+            hashers.get_hasher.cache_clear()
+            with self.assertNumQueries(0):
+                valid, new_hash = self.user.verify_password('secret123')
+            self.assertTrue(valid)
+            self.assertTrue(new_hash.startswith('$2b$05$'))
+
+            self.assertTrue(self.user.check_password('secret123'))
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password_hash.startswith('$2b$05$'))
+
+
+@override_settings(BCRYPT_ROUNDS=4)
+class LoginThrottleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        hashers.get_hasher.cache_clear()
+        cls.addClassCleanup(hashers.get_hasher.cache_clear)
+        cls.user = create_user('user@example.com', Role.objects.create(name='user'), 'secret123')
+
+    def throttle(self, ip_rate, email_rate):
+        patcher = mock.patch.object(login_throttle, '_limiters', {
+            'ip': TokenBucket(ip_rate, max_keys=100),
+            'email': TokenBucket(email_rate, max_keys=100),
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, password):
+        return self.client.post(
+            '/api/auth/login/', {'email': 'user@example.com', 'password': password},
+            content_type='application/json'
+        )
+
+    def test_email_limit_applies_before_password_check(self):
+        self.throttle('100/min', '2/min')
+        self.assertEqual(self.login('wrong').status_code, 400)
+        self.assertEqual(self.login('wrong').status_code, 400)
+
+        completed = password_pool.completed
+        response = self.login('secret123')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(password_pool.completed, completed)
+
+    def test_ip_limit(self):
+        self.throttle('1/min', '100/min')
+        self.assertEqual(self.login('secret123').status_code, 200)
+        response = self.login('secret123')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class PurgeExpiredSessionsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = create_user('user@example.com', Role.objects.create(name='user'))
+        sessions = [Session.create_session(user) for _ in range(7)]
+        Session.objects.filter(pk__in=[session.pk for session in sessions[:5]]).update(
+            expires_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def test_purges_in_batches(self):
+        # Три пачки (2 + 2 + 1): SELECT id ... LIMIT 2 и DELETE на каждую
+        with self.assertNumQueries(6):
+            deleted = Session.purge_expired(batch_size=2)
+        self.assertEqual(deleted, 5)
+        self.assertEqual(Session.objects.count(), 2)
+        self.assertFalse(Session.objects.filter(expires_at__lte=timezone.now()).exists())
+
+    def test_purge_command(self):
+        out = StringIO()
+        call_command('purge_sessions', '--batch-size', '3', stdout=out)
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+
+
+class SessionRevokeTests(CachedSessionTestCase):
+
+    def test_admin_revoke_evicts_sessions(self):
+        self.warm_up()
+        admin_token = Session.create_session(self.admin).token
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/admin/sessions/revoke/', {'user_ids': [self.user.pk]},
+                content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+            )
+        self.assertEqual(response.json(), {'revoked': 1})
+        self.assertEqual(self.me(self.token).status_code, 401)
+        self.assertEqual(self.me(admin_token).status_code, 200)
+
+    def test_revoke_returns_deleted_rows(self):
+        Session.create_session(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Session.objects.filter(user=self.user).revoke(), 2)
+        self.assertFalse(Session.objects.filter(user=self.user).exists())
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+    def test_revoke_in_transaction_evicts_after_commit_only(self):
+        self.warm_up()
+        with mock.patch('authentication.models.evict_sessions') as evict:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                Session.objects.filter(user=self.user).revoke()
+                evict.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        evict.assert_called_once()
+
+    def test_revoke_by_role_bumps_role_version_once(self):
+        self.warm_up()
+        versions = shared_session_cache.current_versions(self.user.pk, self.user.role_id)
+        cache = shared_session_cache.cache
+        with mock.patch.object(cache, 'incr', wraps=cache.incr) as incr:
+            with self.captureOnCommitCallbacks(execute=True):
+                Session.objects.matching(role_id=self.user.role_id).revoke(role_id=self.user.role_id)
+        incr.assert_called_once_with(shared_session_cache._role_version_key(self.user.role_id))
+        current = shared_session_cache.current_versions(self.user.pk, self.user.role_id)
+        self.assertEqual(current[0], versions[0])
+        self.assertNotEqual(current[1], versions[1])
+        self.assertEqual(self.me(self.token).status_code, 401)
+
+    def test_revoke_by_users_bumps_versions_in_one_call(self):
+        other = create_user('other@example.com', self.user.role)
+        Session.create_session(other)
+        cache = shared_session_cache.cache
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            with self.captureOnCommitCallbacks(execute=True):
+                Session.objects.matching(user_ids=[self.user.pk, other.pk]).revoke()
+        set_many.assert_called_once()
+        self.assertEqual(len(set_many.call_args.args[0]), 2)
+
+
+class MetricsTests(TestCase):
+
+    def test_render_counter_and_histogram(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('requests_total', 'Requests', ('outcome',))
+        histogram = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        counter.inc('ok')
+        counter.inc('ok')
+        counter.inc('error')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE requests_total counter', lines)
+        self.assertIn('requests_total{outcome="ok"} 2', lines)
+        self.assertIn('requests_total{outcome="error"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn('latency_seconds_count 2', lines)
+
+    def test_stats_hit_ratio(self):
+        registry = MetricsRegistry()
+        registry.register_stats('cache', 'Cache', lambda: {'hits': 3, 'misses': 1})
+        self.assertIn('cache_hit_ratio 0.75', registry.render().splitlines())
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/auth/me/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE auth_requests_total counter', response.content.decode())
+
+
+class AuthEventLogTests(TestCase):
+
+    def count(self, event, result):
+        return AUTH_EVENTS.collect().get((event, result), 0)
+
+    @override_settings(AUTH_EVENT_SAMPLE_RATES={'missing_token': 0.0})
+    def test_sampled_out(self):
+        before = self.count('missing_token', 'sampled_out')
+        with self.assertNoLogs('authentication.events'):
+            log_auth_event('missing_token')
+        self.assertEqual(self.count('missing_token', 'sampled_out'), before + 1)
+
+    def test_rate_limited(self):
+        before = self.count('login', 'rate_limited')
+        with mock.patch.object(events, '_limiter', TokenBucket('1/min', max_keys=10)):
+            with self.assertLogs('authentication.events') as logs:
+                log_auth_event('login', user_id=1)
+                log_auth_event('login', user_id=2)
+        self.assertEqual([record.user_id for record in logs.records], [1])
+        self.assertEqual(self.count('login', 'rate_limited'), before + 1)
+
+    def test_json_record(self):
+        record = logging.makeLogRecord({'msg': 'login', 'levelname': 'INFO', 'name': 'authentication.events'})
+        record.user_id = 7
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual((data['event'], data['user_id'], data['level']), ('login', 7, 'INFO'))
+
+    def test_full_queue_drops_records(self):
+        # Без слушателя очередь никто не разбирает
+        handler = NonBlockingHandler(queue_size=1)
+        with mock.patch('authentication.log_handlers.QueueListener'):
+            for _ in range(3):
+                handler.enqueue(logging.makeLogRecord({'msg': 'login'}))
+        self.assertEqual(handler.dropped, 2)
+
+    def test_listener_starts_per_process(self):
+        handler = NonBlockingHandler(stream=StringIO())
+        handler.setFormatter(JsonFormatter())
+        self.addCleanup(handler.close)
+        self.assertIsNone(handler.listener)
+
+        handler.handle(logging.makeLogRecord({'msg': 'login', 'levelno': logging.INFO}))
+        parent_listener = handler.listener
+        self.assertIsNotNone(parent_listener)
+
+        # Процесс-потомок после fork: поток родителя в нем не работает
+        with mock.patch('authentication.log_handlers.os.getpid', return_value=os.getpid() + 1):
+            handler.handle(logging.makeLogRecord({'msg': 'logout', 'levelno': logging.INFO}))
+            self.assertIsNot(handler.listener, parent_listener)
+            handler.close()
+        parent_listener.stop()
+        self.assertIn('"event": "logout"', handler.target.stream.getvalue())
@@ -0,0 +1,130 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from authentication.metrics import registry
+
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60)"""
+    try:
+        count, period = rate.split('/')
+        return int(count), PERIODS[period]
+    except (ValueError, KeyError):
+        raise ImproperlyConfigured(f'Invalid throttle rate "{rate}"')
+
+
+class TokenBucket:
+    """
+    Token bucket на ключ в памяти процесса. Для ключа хранится только пара
+    (токены, время пополнения), число ключей ограничено - самые давние вытесняются.
+    """
+
+    def __init__(self, rate, max_keys):
+        self.capacity, period = parse_rate(rate)
+        self.refill_per_second = self.capacity / period
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key):
+        """Возвращает 0, если запрос разрешен, иначе через сколько секунд повторить."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_per_second)
+
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / self.refill_per_second
+
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return retry_after
+
+
+class CacheWindowCounter:
+    """
+    Общий для воркеров лимит через Django cache: счетчик в фиксированном окне.
+    Используются только атомарные add/incr, поэтому подходит для memcached и Redis.
+    """
+
+    def __init__(self, scope, rate, alias):
+        self.scope = scope
+        self.capacity, self.period = parse_rate(rate)
+        self.alias = alias
+
+    async def aconsume(self, key):
+        cache = caches[self.alias]
+        now = time.time()
+        window = int(now // self.period)
+        cache_key = f'throttle:{self.scope}:{key}:{window}'
+
+        await cache.aadd(cache_key, 0, self.period)
+        try:
+            count = await cache.aincr(cache_key)
+        except ValueError:
+            # Ключ истек между add и incr - начинаем новое окно
+            await cache.aset(cache_key, 1, self.period)
+            count = 1
+
+        if count <= self.capacity:
+            return 0
+        return (window + 1) * self.period - now
+
+
+class LoginThrottle:
+
+    def __init__(self, rates, alias, max_keys):
+        self.alias = alias
+        self.throttled = {scope: 0 for scope in rates}
+        if alias:
+            self._limiters = {
+                scope: CacheWindowCounter(scope, rate, alias) for scope, rate in rates.items()
+            }
+        else:
+            self._limiters = {
+                scope: TokenBucket(rate, max_keys) for scope, rate in rates.items()
+            }
+
+    async def check(self, scope, key):
+        limiter = self._limiters.get(scope)
+        if limiter is None or not key:
+            return 0
+
+        if self.alias:
+            retry_after = await limiter.aconsume(key)
+        else:
+            retry_after = limiter.consume(key)
+
+        if retry_after:
+            self.throttled[scope] += 1
+        return retry_after
+
+    def stats(self):
+        return {'throttled': dict(self.throttled)}
+
+
+def retry_after_header(retry_after):
+    return str(max(1, math.ceil(retry_after)))
+
+
+login_throttle = LoginThrottle(
+    rates=settings.LOGIN_THROTTLE_RATES,
+    alias=settings.LOGIN_THROTTLE_CACHE_ALIAS,
+    max_keys=settings.LOGIN_THROTTLE_MAX_KEYS
+)
+
+registry.register_stats('auth_login_throttle', 'Login throttling', login_throttle.stats)
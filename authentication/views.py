@@ -1,8 +1,16 @@
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from authentication.decorators import require_auth
-from authentication.models import Session
+from authentication.events import log_auth_event
+from authentication.models import User, Session
+from authentication.password_pool import PasswordPoolFull, password_pool
+from authentication.throttling import login_throttle, retry_after_header
 from authentication.serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
@@ -10,6 +18,8 @@ from authentication.serializers import (
     UserUpdateSerializer
 )
 
+FORM_CONTENT_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+
 
 @api_view(['POST'])
 def register_view(request):
@@ -24,38 +34,115 @@ def register_view(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['POST'])
-def login_view(request):
-    serializer = UserLoginSerializer(data=request.data)
-    
-    if serializer.is_valid():
-        user = serializer.validated_data['user']
-        
-        ip_address = request.META.get('REMOTE_ADDR')
-        user_agent = request.META.get('HTTP_USER_AGENT')
-        
-        session = Session.create_session(
-            user=user,
-            ip_address=ip_address,
-            user_agent=user_agent
+async def login_view(request):
+    if request.method != 'POST':
+        response = JsonResponse(
+            {'detail': f'Method "{request.method}" not allowed.'},
+            status=status.HTTP_405_METHOD_NOT_ALLOWED
         )
-        
-        response_data = {
-            'token': session.session_token,
-            'user': UserSerializer(user).data,
-            'expires_at': session.expires_at.isoformat()
-        }
-        
-        return Response(response_data, status=status.HTTP_200_OK)
-    
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        response['Allow'] = 'POST'
+        return response
+
+    # Лимиты проверяются до запроса пользователя и до bcrypt
+    ip_address = request.META.get('REMOTE_ADDR')
+    retry_after = await login_throttle.check('ip', ip_address)
+    if retry_after:
+        log_auth_event('login_throttled', request, scope='ip')
+        return _login_throttled_response(retry_after)
+
+    # Как и прежний @api_view, принимаем JSON и формы (urlencoded и multipart)
+    if request.content_type in FORM_CONTENT_TYPES:
+        payload = request.POST
+    else:
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = UserLoginSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    email = serializer.validated_data['email']
+    password = serializer.validated_data['password']
+
+    retry_after = await login_throttle.check('email', email)
+    if retry_after:
+        log_auth_event('login_throttled', request, scope='email')
+        return _login_throttled_response(retry_after)
+
+    user = await User.objects.select_related('role').filter(email=email).afirst()
+    if not user:
+        log_auth_event('login_failed', request, reason='unknown_email')
+        return JsonResponse(
+            {'non_field_errors': ['Неверный email или пароль']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not user.is_active:
+        log_auth_event('login_failed', request, reason='inactive', user_id=user.id)
+        return JsonResponse(
+            {'non_field_errors': ['Аккаунт деактивирован']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # bcrypt выполняется в ограниченном пуле, event loop продолжает обслуживать запросы
+    try:
+        password_valid, new_hash = await password_pool.check_password(user, password)
+    except PasswordPoolFull:
+        log_auth_event('login_rejected', request, level=logging.WARNING, reason='password_pool_full')
+        response = JsonResponse(
+            {'error': 'Too many login attempts in progress, retry later'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        response['Retry-After'] = '1'
+        return response
+
+    if not password_valid:
+        log_auth_event('login_failed', request, reason='bad_password', user_id=user.id)
+        return JsonResponse(
+            {'non_field_errors': ['Неверный email или пароль']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if new_hash:
+        await sync_to_async(user.update_password_hash)(new_hash)
+
+    session = await sync_to_async(Session.create_session)(
+        user=user,
+        ip_address=ip_address,
+        user_agent=request.META.get('HTTP_USER_AGENT')
+    )
+
+    log_auth_event('login', request, user_id=user.id)
+
+    response_data = {
+        'token': session.token,
+        'user': UserSerializer(user).data,
+        'expires_at': session.expires_at.isoformat()
+    }
+
+    return JsonResponse(response_data, status=status.HTTP_200_OK)
+
+
+# csrf_exempt в Django 4.2 не поддерживает async-представления, ставим флаг напрямую
+login_view.csrf_exempt = True
+
+
+def _login_throttled_response(retry_after):
+    response = JsonResponse(
+        {'error': 'Too many login attempts', 'detail': 'Retry later'},
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    response['Retry-After'] = retry_after_header(retry_after)
+    return response
 
 
 @api_view(['GET'])
 @require_auth
 def me_view(request):
 
-    serializer = UserSerializer(request.user)
+    serializer = UserSerializer(request.user.load_profile())
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -66,7 +153,7 @@ def logout_view(request):
     token = request.META.get('HTTP_AUTHORIZATION', '').replace('Bearer ', '')
     
     if token:
-        Session.objects.filter(session_token=token).delete()
+        Session.objects.filter(token_digest=Session.hash_token(token)).revoke()
     
     return Response(
         {'message': 'Successfully logged out'},
@@ -77,7 +164,7 @@ def logout_view(request):
 @require_auth
 def update_profile_view(request):
     serializer = UserUpdateSerializer(
-        request.user, 
+        request.user.load_profile(), 
         data=request.data, 
         partial=(request.method == 'PATCH')
     )
@@ -91,12 +178,12 @@ def update_profile_view(request):
 @api_view(['DELETE'])
 @require_auth
 def delete_account_view(request):
-    user = request.user
+    user = request.user.load_profile()
     
     user.is_active = False
     user.save()
     
-    Session.objects.filter(user=user).delete()
+    Session.objects.filter(user=user).revoke()
     
     return Response(
         {'message': 'Account successfully deactivated'},
@@ -0,0 +1,94 @@
+import csv
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from authentication.models import Session, User
+from authorization.models import AccessRule
+
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Секреты (password_hash, token_digest) в выгрузку не попадают
+EXPORTS = {
+    'users': (User, (
+        'id', 'email', 'first_name', 'last_name', 'middle_name',
+        'role_id', 'is_active', 'created_at', 'updated_at',
+    )),
+    'sessions': (Session, (
+        'id', 'user_id', 'expires_at', 'created_at', 'ip_address', 'user_agent',
+    )),
+    'access-rules': (AccessRule, (
+        'id', 'role_id', 'element_id', *AccessRule.PERMISSION_FIELDS,
+        'permission_mask', 'created_at', 'updated_at',
+    )),
+}
+
+
+def export_rows(table):
+    """QuerySet строк выгрузки (values, порядок по id) и список колонок"""
+    model, fields = EXPORTS[table]
+    return model.objects.order_by('id').values_list(*fields), fields
+
+
+def iter_export(table, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Выгрузка таблицы кусками текста. Строки читаются iterator(chunk_size) -
+    в PostgreSQL это серверный курсор, поэтому в памяти не больше одного куска.
+    """
+    rows, fields = export_rows(table)
+    encoder = RowEncoder(fmt, fields)
+    header = encoder.header()
+    if header:
+        yield header
+
+    lines = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        lines.append(encoder.encode(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+async def aiter_export(table, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    # Под ASGI Django 4.2 собирает синхронный итератор StreamingHttpResponse в список целиком,
+    # а QuerySet.aiterator() выполняет запрос в event loop. Куски берутся из iter_export
+    # по одному в потоке для sync-кода - курсор и соединение остаются в одном потоке
+    chunks = iter_export(table, fmt, chunk_size)
+    next_chunk = sync_to_async(lambda: next(chunks, None))
+    while (chunk := await next_chunk()) is not None:
+        yield chunk
+
+
+class RowEncoder:
+
+    def __init__(self, fmt, fields):
+        self.fmt = fmt
+        self.fields = fields
+        self._buffer = _LineBuffer()
+        self._writer = csv.writer(self._buffer)
+        self._json = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def header(self):
+        if self.fmt == 'csv':
+            return self._writer.writerow(self.fields)
+        return ''
+
+    def encode(self, row):
+        if self.fmt == 'csv':
+            return self._writer.writerow(row)
+        return self._json.encode(dict(zip(self.fields, row))) + '\n'
+
+
+class _LineBuffer:
+    # csv.writer пишет строку сюда и получает ее обратно как результат writerow
+
+    def write(self, value):
+        return value
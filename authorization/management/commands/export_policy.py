@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from authorization.policy import export_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет роли, бизнес-элементы и правила доступа в файл снимка политики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.RBAC_POLICY_SNAPSHOT)
+
+    def handle(self, *args, **options):
+        path = options['output']
+        if not path:
+            raise CommandError('Specify --output or set RBAC_POLICY_SNAPSHOT')
+
+        started = time.monotonic()
+        version, matrix = export_snapshot(path)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Exported policy version {version} ({len(matrix.masks)} rules) to {path} in {elapsed:.2f}s'
+        )
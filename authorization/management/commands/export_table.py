@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authorization.export import EXPORT_CHUNK_SIZE, EXPORTS, FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка users, sessions или access-rules в NDJSON/CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--output', help='Файл; по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunks = iter_export(options['table'], options['format'], options['chunk_size'])
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        started = time.monotonic()
+        with open(options['output'], 'w', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'Exported {options["table"]} to {options["output"]} in {elapsed:.2f}s')
@@ -0,0 +1,102 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from authentication.middleware import CustomAuthMiddleware
+from authorization.permissions import (
+    PermissionChecker,
+    _apply_permission_result,
+    _authorize_user,
+    _method_not_allowed,
+    observe_permission_check
+)
+from authorization.policy import policy_store
+
+
+class PermissionMiddleware:
+    """
+    Проверка прав по пути запроса: элемент определяется по BusinessElement.endpoint
+    (дерево префиксов в матрице прав), решение принимается до вызова view.
+    Пути без элемента пропускаются. Должен стоять после CustomAuthMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if self._is_public(request):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            matrix = policy_store.get()
+        except Exception as e:
+            return self._error_response(request, e, started)
+
+        error_response = self._authorize(request, matrix, started)
+        if error_response:
+            return error_response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self._is_public(request):
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            matrix = await policy_store.aget()
+        except Exception as e:
+            return self._error_response(request, e, started)
+
+        error_response = self._authorize(request, matrix, started)
+        if error_response:
+            return error_response
+        return await self.get_response(request)
+
+    def _is_public(self, request):
+        return request.path.startswith(CustomAuthMiddleware.public_paths)
+
+    def _error_response(self, request, error, started):
+        result = PermissionChecker._error_result(error)
+        observe_permission_check(
+            'unresolved', PermissionChecker.get_action_from_method(request.method) or '', result, started
+        )
+        return _apply_permission_result(request, result)
+
+    def _authorize(self, request, matrix, started):
+        resolved = matrix.resolve_path(request.path)
+        if resolved is None:
+            return None
+
+        element_id, element_name = resolved
+
+        # OPTIONS отдает только описание endpoint'а, его обрабатывает view
+        if request.method == 'OPTIONS':
+            return None
+
+        error_response = _authorize_user(request)
+        if error_response:
+            return error_response
+
+        action = PermissionChecker.get_action_from_method(request.method)
+        if not action:
+            return _method_not_allowed()
+
+        permission_result = PermissionChecker.evaluate_element(
+            matrix, request.user, element_id, element_name, action
+        )
+        observe_permission_check(element_name, action, permission_result, started)
+        error_response = _apply_permission_result(request, permission_result)
+        if error_response:
+            return error_response
+
+        request.authorized_element = element_name
+        return None
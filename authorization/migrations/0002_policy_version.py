@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+def create_policy_version(apps, schema_editor):
+    PolicyVersion = apps.get_model('authorization', 'PolicyVersion')
+    PolicyVersion.objects.get_or_create(pk=1, defaults={'version': 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authorization', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolicyVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Версия политики',
+                'verbose_name_plural': 'Версии политики',
+                'db_table': 'policy_version',
+            },
+        ),
+        migrations.RunPython(create_policy_version, migrations.RunPython.noop),
+    ]
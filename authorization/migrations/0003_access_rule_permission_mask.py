@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:25
+
+from django.db import migrations, models
+from django.db.models import Case, Q, Value, When
+
+PERMISSION_FIELDS = (
+    'read_permission', 'read_all_permission',
+    'create_permission',
+    'update_permission', 'update_all_permission',
+    'delete_permission', 'delete_all_permission',
+)
+
+
+def permission_mask_expression():
+    return sum(
+        Case(When(**{field: True}, then=Value(1 << bit)), default=Value(0))
+        for bit, field in enumerate(PERMISSION_FIELDS)
+    )
+
+
+def fill_permission_mask(apps, schema_editor):
+    AccessRule = apps.get_model('authorization', 'AccessRule')
+    AccessRule.objects.update(permission_mask=permission_mask_expression())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authorization', '0002_policy_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessrule',
+            name='permission_mask',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Маска прав'),
+        ),
+        migrations.RunPython(fill_permission_mask, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='accessrule',
+            index=models.Index(fields=['element', 'permission_mask'], name='access_rules_element_mask_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='accessrule',
+            constraint=models.CheckConstraint(
+                check=Q(permission_mask=permission_mask_expression()),
+                name='access_rules_permission_mask_check'
+            ),
+        ),
+    ]
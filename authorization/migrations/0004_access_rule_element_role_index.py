@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authorization', '0003_access_rule_permission_mask'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accessrule',
+            index=models.Index(fields=['element', 'role'], name='access_rules_element_role_idx'),
+        ),
+    ]
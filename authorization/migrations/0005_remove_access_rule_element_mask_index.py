@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authorization', '0004_access_rule_element_role_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='accessrule',
+            name='access_rules_element_mask_idx',
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
 
 class Role(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name='Название')
@@ -28,7 +30,91 @@ class BusinessElement(models.Model):
         return self.name
     
 
+class AccessRuleQuerySet(models.QuerySet):
+    # Битовые запросы по permission_mask, например: "какие роли могут delete_all на элементе X".
+    # B-tree не ищет по (mask & bit): индекс сужает выборку до правил элемента
+    # (по одному на роль), а условие на биты проверяется для каждой из этих строк
+
+    def with_all_flags(self, *fields):
+        mask = AccessRule.mask_for_fields(fields)
+        alias = f'granted_{mask}'
+        return self.alias(**{alias: F('permission_mask').bitand(mask)}).filter(**{alias: mask})
+
+    def with_any_flags(self, *fields):
+        mask = AccessRule.mask_for_fields(fields)
+        alias = f'granted_{mask}'
+        return self.alias(**{alias: F('permission_mask').bitand(mask)}).filter(**{f'{alias}__gt': 0})
+
+    def granting(self, element, action):
+        # Правила, дающие действие над элементом хотя бы на свои объекты
+        own_field, all_field = AccessRule.ACTION_FIELDS[action]
+        return self.filter(element=element).with_any_flags(*filter(None, (own_field, all_field)))
+
+    def copy_to_role(self, role, overrides=None):
+        """
+        Копирует выбранные правила в роль role одним INSERT ... SELECT.
+        overrides {поле: bool} задает флаг во всех копиях; маска пересчитывается
+        в том же запросе: (mask & ~overridden) | granted. Возвращает число строк.
+        """
+        overrides = overrides or {}
+        keep_mask = ~AccessRule.mask_for_fields(overrides) & AccessRule.mask_for_fields(AccessRule.PERMISSION_FIELDS)
+        set_mask = AccessRule.mask_for_fields([field for field, value in overrides.items() if value])
+        now = Value(timezone.now(), output_field=models.DateTimeField())
+
+        columns = {
+            'role_id': Value(role.pk),
+            'element_id': F('element_id'),
+            **{
+                field: Value(overrides[field]) if field in overrides else F(field)
+                for field in AccessRule.PERMISSION_FIELDS
+            },
+            'permission_mask': F('permission_mask').bitand(keep_mask).bitor(set_mask),
+            'created_at': now,
+            'updated_at': now,
+        }
+        # Псевдонимы не должны совпадать с полями модели; порядок колонок сохраняется
+        select = self.order_by().values(**{f'copy_{i}': expr for i, expr in enumerate(columns.values())})
+        sql, params = select.query.sql_with_params()
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(self.model._meta.db_table)} '
+                f'({", ".join(quote(column) for column in columns)}) {sql}',
+                params
+            )
+            return cursor.rowcount
+
+
+# Порядок полей задает биты маски прав: 1 << индекс
+PERMISSION_FIELDS = (
+    'read_permission', 'read_all_permission',
+    'create_permission',
+    'update_permission', 'update_all_permission',
+    'delete_permission', 'delete_all_permission',
+)
+
+
+def permission_mask_expression():
+    # Маска из флагов средствами SQL - то же выражение в миграции 0003
+    return sum(
+        Case(When(**{field: True}, then=Value(1 << bit)), default=Value(0))
+        for bit, field in enumerate(PERMISSION_FIELDS)
+    )
+
+
 class AccessRule(models.Model):
+    PERMISSION_FIELDS = PERMISSION_FIELDS
+
+    # action -> (право на свои объекты, право на все)
+    ACTION_FIELDS = {
+        'read': ('read_permission', 'read_all_permission'),
+        'create': (None, 'create_permission'),
+        'update': ('update_permission', 'update_all_permission'),
+        'delete': ('delete_permission', 'delete_all_permission'),
+    }
+
     role = models.ForeignKey(Role, on_delete=models.CASCADE, verbose_name='Роль')
     
     element = models.ForeignKey(BusinessElement, on_delete=models.CASCADE, verbose_name='Элемент')
@@ -44,12 +130,70 @@ class AccessRule(models.Model):
     delete_permission = models.BooleanField(default=False, verbose_name='Удаление своих')
     delete_all_permission = models.BooleanField(default=False, verbose_name='Удаление всех')
     
+    # Те же семь флагов одним числом; пересчитывается в save(), согласованность
+    # с флагами (в том числе при update()/bulk_update()) проверяет CHECK в БД
+    permission_mask = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Маска прав')
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AccessRuleQuerySet.as_manager()
+
     class Meta:
         db_table = 'access_rules'
         unique_together = [['role', 'element']]
+        indexes = [
+            # Правила элемента: постраничный список по role_id и битовые запросы по элементу;
+            # (role, element) покрыт unique_together
+            models.Index(fields=['element', 'role'], name='access_rules_element_role_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=Q(permission_mask=permission_mask_expression()),
+                name='access_rules_permission_mask_check'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.role.name} -> {self.element.name}"
+
+    def save(self, *args, **kwargs):
+        self.permission_mask = self.get_permission_mask()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'permission_mask' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'permission_mask']
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def mask_for_fields(cls, fields):
+        return cls.mask_from_flags(field in fields for field in cls.PERMISSION_FIELDS)
+
+    @classmethod
+    def mask_from_flags(cls, flags):
+        mask = 0
+        for bit, flag in enumerate(flags):
+            if flag:
+                mask |= 1 << bit
+        return mask
+
+    @classmethod
+    def scope_for(cls, mask, action):
+        _, all_field = cls.ACTION_FIELDS[action]
+        return 'all' if mask & cls.mask_for_fields([all_field]) else 'own'
+
+    def get_permission_mask(self):
+        return self.mask_from_flags(getattr(self, field) for field in self.PERMISSION_FIELDS)
+
+
+class PolicyVersion(models.Model):
+    # Единственная строка (pk=1): монотонный счетчик изменений политики RBAC
+    version = models.BigIntegerField(default=0, verbose_name='Версия')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'policy_version'
+        verbose_name = 'Версия политики'
+        verbose_name_plural = 'Версии политики'
 
     def __str__(self):
-        return f"{self.role.name} -> {self.element.name}"
\ No newline at end of file
+        return str(self.version)
@@ -0,0 +1,143 @@
+import base64
+import heapq
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def keyset_page(request, queryset, ordering, serialize):
+    """
+    Страница по курсору (keyset): WHERE (ordering) > (последняя строка) ORDER BY ordering LIMIT n.
+    Стоимость не зависит от номера страницы, count() не выполняется без ?count=exact|approx.
+    ordering - поля по возрастанию, последнее уникально; их должен покрывать индекс.
+    """
+    limit, cursor, count_mode = _page_params(request)
+    rows = list(_page_queryset(queryset, ordering, cursor).order_by(*ordering)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    page = {
+        'results': serialize(rows),
+        'next_cursor': encode_cursor([_value(rows[-1], field) for field in ordering]) if has_more else None,
+    }
+    if count_mode:
+        page['count'] = approximate_count(queryset) if count_mode == 'approx' else queryset.count()
+    return page
+
+
+def merged_keyset_page(request, querysets, field, serialize):
+    """
+    Страница по курсору для объединения непересекающихся наборов, упорядоченных по одному
+    уникальному полю. Каждый набор читается своим запросом WHERE field > курсор ORDER BY field
+    LIMIT n+1, который обслуживает его собственный индекс, и результаты сливаются по field.
+    Нужна, когда фильтр IN (...) по первому столбцу индекса не дает общего порядка по field.
+    """
+    limit, cursor, count_mode = _page_params(request)
+    pages = [
+        list(_page_queryset(queryset, (field,), cursor).order_by(field)[:limit + 1])
+        for queryset in querysets
+    ]
+    rows = list(islice(heapq.merge(*pages, key=lambda row: _value(row, field)), limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    page = {
+        'results': serialize(rows),
+        'next_cursor': encode_cursor([_value(rows[-1], field)]) if has_more else None,
+    }
+    if count_mode:
+        count = approximate_count if count_mode == 'approx' else lambda queryset: queryset.count()
+        page['count'] = sum(count(queryset) for queryset in querysets)
+    return page
+
+
+def approximate_count(queryset):
+    """
+    Оценка числа строк из статистики PostgreSQL (pg_class.reltuples) для таблицы без фильтров;
+    для отфильтрованного набора, других СУБД или таблицы без статистики - точный count().
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    return queryset.count()
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise InvalidPage('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidPage('Invalid cursor')
+    return values
+
+
+def _page_params(request):
+    limit = _parse_limit(request.query_params.get('limit'))
+    count_mode = request.query_params.get('count')
+    if count_mode not in (None, 'exact', 'approx'):
+        raise InvalidPage('count must be "exact" or "approx"')
+    return limit, request.query_params.get('cursor'), count_mode
+
+
+def _page_queryset(queryset, ordering, cursor):
+    if not cursor:
+        return queryset
+    try:
+        return queryset.filter(_after(ordering, decode_cursor(cursor, len(ordering))))
+    except (TypeError, ValueError, ValidationError):
+        # Значение в курсоре не подходит к типу поля
+        raise InvalidPage('Invalid cursor')
+
+
+def _parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidPage('limit must be an integer')
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def _after(ordering, values):
+    # (a, b) > (x, y)  =>  a >= x AND (a > x OR (a = x AND b > y)).
+    # Избыточное a >= x дает планировщику границу для поиска по индексу: одно OR
+    # по первому столбцу он не превращает в диапазон
+    condition = Q()
+    for i, field in enumerate(ordering):
+        term = Q(**{f'{field}__gt': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            term &= Q(**{prev_field: prev_value})
+        condition |= term
+    if len(ordering) > 1:
+        condition = Q(**{f'{ordering[0]}__gte': values[0]}) & condition
+    return condition
+
+
+def _value(row, field):
+    return row[field] if isinstance(row, dict) else getattr(row, field)
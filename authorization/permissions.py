@@ -1,6 +1,35 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.db import models
 from django.http import JsonResponse
 from functools import wraps
-from authorization.models import AccessRule, BusinessElement
+from authentication.events import log_auth_event
+from authentication.metrics import registry
+from authorization.policy import ACTION_BITS, CREATE, policy_store
+
+
+# Причины решения; текст сообщения строится из них только по запросу
+GRANTED = 'granted'
+DENIED = 'denied'
+FULL_ACCESS = 'full_access'
+OWN_ONLY = 'own_only'
+NOT_OWNER = 'not_owner'
+NO_PERMISSION = 'no_permission'
+NO_RULE = 'no_rule'
+NO_ELEMENT = 'no_element'
+UNKNOWN_ACTION = 'unknown_action'
+
+PERMISSION_CHECKS = registry.counter(
+    'rbac_permission_checks_total',
+    'Permission checks by element, action and outcome (allowed, filtered, denied, error)',
+    ('element', 'action', 'outcome')
+)
+PERMISSION_CHECK_SECONDS = registry.histogram(
+    'rbac_permission_check_seconds',
+    'Permission check latency',
+    ('element', 'action', 'outcome')
+)
 
 
 class PermissionChecker:
@@ -18,136 +47,283 @@ class PermissionChecker:
 
     @staticmethod
     def check_permission(user, element_name, action, obj_owner_id=None):
+        started = time.perf_counter()
         try:
-            element = BusinessElement.objects.filter(name=element_name).first()
-            if not element:
-                return {
-                    'allowed': False,
-                    'requires_filter': False,
-                    'message': f'Business element "{element_name}" not found'
-                }
-
-            access_rule = AccessRule.objects.filter(
-                role=user.role,
-                element=element
-            ).first()
-
-            if not access_rule:
-                return {
-                    'allowed': False,
-                    'requires_filter': False,
-                    'message': f'No access rule for role "{user.role.name}" and element "{element_name}"'
-                }
-
-            if action == 'create':
-                allowed = access_rule.create_permission
-                return {
-                    'allowed': allowed,
-                    'requires_filter': False,
-                    'message': 'Access denied' if not allowed else 'Access granted'
-                }
-
-            if action == 'read':
-                if access_rule.read_all_permission:
-                    return {'allowed': True, 'requires_filter': False, 'message': 'Full read access'}
-                elif access_rule.read_permission:
-                    if obj_owner_id is None:
-                        return {'allowed': True, 'requires_filter': True, 'message': 'Read own only'}
-                    else:
-                        is_owner = (obj_owner_id == user.id)
-                        return {
-                            'allowed': is_owner,
-                            'requires_filter': False,
-                            'message': 'Access denied - not owner' if not is_owner else 'Access granted'
-                        }
-                else:
-                    return {'allowed': False, 'requires_filter': False, 'message': 'No read permission'}
-
-            elif action == 'update':
-                if access_rule.update_all_permission:
-                    return {'allowed': True, 'requires_filter': False, 'message': 'Full update access'}
-                elif access_rule.update_permission:
-                    if obj_owner_id is None:
-                        return {'allowed': True, 'requires_filter': True, 'message': 'Update own only'}
-                    else:
-                        is_owner = (obj_owner_id == user.id)
-                        return {
-                            'allowed': is_owner,
-                            'requires_filter': False,
-                            'message': 'Access denied - not owner' if not is_owner else 'Access granted'
-                        }
-                else:
-                    return {'allowed': False, 'requires_filter': False, 'message': 'No update permission'}
-
-            elif action == 'delete':
-                if access_rule.delete_all_permission:
-                    return {'allowed': True, 'requires_filter': False, 'message': 'Full delete access'}
-                elif access_rule.delete_permission:
-                    if obj_owner_id is None:
-                        return {'allowed': True, 'requires_filter': True, 'message': 'Delete own only'}
-                    else:
-                        is_owner = (obj_owner_id == user.id)
-                        return {
-                            'allowed': is_owner,
-                            'requires_filter': False,
-                            'message': 'Access denied - not owner' if not is_owner else 'Access granted'
-                        }
-                else:
-                    return {'allowed': False, 'requires_filter': False, 'message': 'No delete permission'}
+            matrix = policy_store.get()
+        except Exception as e:
+            result = PermissionChecker._error_result(e)
+        else:
+            result = PermissionChecker.evaluate(matrix, user, element_name, action, obj_owner_id)
+        observe_permission_check(element_name, action, result, started)
+        return result
 
+    @staticmethod
+    async def acheck_permission(user, element_name, action, obj_owner_id=None):
+        started = time.perf_counter()
+        try:
+            matrix = await policy_store.aget()
         except Exception as e:
-            return {
-                'allowed': False,
-                'requires_filter': False,
-                'message': f'Permission check error: {str(e)}'
-            }
+            result = PermissionChecker._error_result(e)
+        else:
+            result = PermissionChecker.evaluate(matrix, user, element_name, action, obj_owner_id)
+        observe_permission_check(element_name, action, result, started)
+        return result
+
+    @staticmethod
+    def check_many(user, checks, with_messages=False):
+        """
+        Проверка набора (element_name, action, obj_owner_id) для одного пользователя.
+        Правила роли выбираются один раз; возвращает список пар
+        (allowed, requires_filter), а с with_messages=True - словари как у check_permission.
+        """
+        try:
+            matrix = policy_store.get()
+        except Exception as e:
+            return PermissionChecker._many_error_result(e, len(checks), with_messages)
+        return PermissionChecker.evaluate_many(matrix, user, checks, with_messages)
+
+    @staticmethod
+    async def acheck_many(user, checks, with_messages=False):
+        try:
+            matrix = await policy_store.aget()
+        except Exception as e:
+            return PermissionChecker._many_error_result(e, len(checks), with_messages)
+        return PermissionChecker.evaluate_many(matrix, user, checks, with_messages)
+
+    @staticmethod
+    def evaluate(matrix, user, element_name, action, obj_owner_id=None):
+        return PermissionChecker.evaluate_many(
+            matrix, user, [(element_name, action, obj_owner_id)], with_messages=True
+        )[0]
+
+    @staticmethod
+    def evaluate_element(matrix, user, element_id, element_name, action):
+        # Элемент уже известен (см. PermissionMatrix.resolve_path) - поиск по имени не нужен
+        allowed, requires_filter, reason = PermissionChecker.decide(
+            matrix.role_masks.get(user.role_id, {}).get(element_id), action, None, user.id
+        )
+        return {
+            'allowed': allowed,
+            'requires_filter': requires_filter,
+            'message': PermissionChecker.describe(reason, matrix, user, element_name, action)
+        }
+
+    @staticmethod
+    def evaluate_many(matrix, user, checks, with_messages=False):
+        role_masks = matrix.role_masks.get(user.role_id, {})
+        results = []
+        for element_name, action, obj_owner_id in checks:
+            element_id = matrix.element_ids.get(element_name)
+            if element_id is None:
+                decision = (False, False, NO_ELEMENT)
+            else:
+                decision = PermissionChecker.decide(
+                    role_masks.get(element_id), action, obj_owner_id, user.id
+                )
+
+            if with_messages:
+                allowed, requires_filter, reason = decision
+                results.append({
+                    'allowed': allowed,
+                    'requires_filter': requires_filter,
+                    'message': PermissionChecker.describe(reason, matrix, user, element_name, action)
+                })
+            else:
+                results.append(decision[:2])
+        return results
+
+    @staticmethod
+    def decide(mask, action, obj_owner_id, user_id):
+        """Возвращает (allowed, requires_filter, reason) без построения сообщения."""
+        if mask is None:
+            return False, False, NO_RULE
+
+        if action == 'create':
+            if mask & CREATE:
+                return True, False, GRANTED
+            return False, False, DENIED
+
+        if action not in ACTION_BITS:
+            return False, False, UNKNOWN_ACTION
+
+        own_bit, all_bit = ACTION_BITS[action]
+        if mask & all_bit:
+            return True, False, FULL_ACCESS
+        elif mask & own_bit:
+            if obj_owner_id is None:
+                return True, True, OWN_ONLY
+            elif obj_owner_id == user_id:
+                return True, False, GRANTED
+            else:
+                return False, False, NOT_OWNER
+        else:
+            return False, False, NO_PERMISSION
+
+    @staticmethod
+    def describe(reason, matrix, user, element_name, action):
+        if reason == NO_ELEMENT:
+            return f'Business element "{element_name}" not found'
+        if reason == NO_RULE:
+            role_name = matrix.role_names.get(user.role_id)
+            return f'No access rule for role "{role_name}" and element "{element_name}"'
+        if reason == UNKNOWN_ACTION:
+            return f'Unknown action "{action}"'
+        if reason == FULL_ACCESS:
+            return f'Full {action} access'
+        if reason == OWN_ONLY:
+            return f'{action.capitalize()} own only'
+        if reason == NO_PERMISSION:
+            return f'No {action} permission'
+        if reason == NOT_OWNER:
+            return 'Access denied - not owner'
+        if reason == DENIED:
+            return 'Access denied'
+        return 'Access granted'
+
+    @staticmethod
+    def _error_result(error):
+        return {
+            'allowed': False,
+            'requires_filter': False,
+            'message': f'Permission check error: {str(error)}',
+            'error': True
+        }
+
+    @staticmethod
+    def _many_error_result(error, count, with_messages):
+        if with_messages:
+            return [PermissionChecker._error_result(error) for _ in range(count)]
+        return [(False, False)] * count
+
+
+def observe_permission_check(element_name, action, result, started):
+    if result.get('error'):
+        outcome = 'error'
+    elif not result['allowed']:
+        outcome = 'denied'
+    elif result['requires_filter']:
+        outcome = 'filtered'
+    else:
+        outcome = 'allowed'
+
+    PERMISSION_CHECKS.inc(element_name, action, outcome)
+    PERMISSION_CHECK_SECONDS.observe(time.perf_counter() - started, element_name, action, outcome)
+
+
+def _authorize_user(request):
+    user = getattr(request, '_authenticated_user', None)
+    
+    if not user:
+        return JsonResponse(
+            {'error': 'Authentication required'},
+            status=401
+        )
+
+    if not user.is_active:
+        return JsonResponse(
+            {'error': 'Account is deactivated'},
+            status=401
+        )
+
+    request.user = user
+    return None
+
+
+def _apply_permission_result(request, permission_result):
+    if not permission_result['allowed']:
+        user = getattr(request, '_authenticated_user', None)
+        log_auth_event(
+            'forbidden', request,
+            user_id=user.id if user else None,
+            detail=permission_result['message']
+        )
+        return JsonResponse(
+            {
+                'error': 'Forbidden',
+                'detail': permission_result['message']
+            },
+            status=403
+        )
+    
+    request.requires_owner_filter = permission_result.get('requires_filter', False)
+    return None
+
+
+def _method_not_allowed():
+    return JsonResponse(
+        {'error': 'Method not allowed'},
+        status=405
+    )
 
 
 def require_permission(element_name):
     def decorator(view_func):
-        @wraps(view_func)
-        def wrapper(request, *args, **kwargs):
-            user = getattr(request, '_authenticated_user', None)
-            
-            if not user:
-                return JsonResponse(
-                    {'error': 'Authentication required'},
-                    status=401
-                )
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                error_response = _authorize_user(request)
+                if error_response:
+                    return error_response
+
+                # Путь уже проверен PermissionMiddleware для этого же элемента
+                if getattr(request, 'authorized_element', None) == element_name:
+                    return await view_func(request, *args, **kwargs)
+
+                action = PermissionChecker.get_action_from_method(request.method)
+                if not action:
+                    return _method_not_allowed()
 
-            if not user.is_active:
-                return JsonResponse(
-                    {'error': 'Account is deactivated'},
-                    status=401
+                permission_result = await PermissionChecker.acheck_permission(
+                    user=request.user,
+                    element_name=element_name,
+                    action=action
                 )
+                error_response = _apply_permission_result(request, permission_result)
+                if error_response:
+                    return error_response
+
+                return await view_func(request, *args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            error_response = _authorize_user(request)
+            if error_response:
+                return error_response
 
-            request.user = user
+            if getattr(request, 'authorized_element', None) == element_name:
+                return view_func(request, *args, **kwargs)
 
             action = PermissionChecker.get_action_from_method(request.method)
             if not action:
-                return JsonResponse(
-                    {'error': 'Method not allowed'},
-                    status=405
-                )
+                return _method_not_allowed()
 
             permission_result = PermissionChecker.check_permission(
-                user=user,
+                user=request.user,
                 element_name=element_name,
                 action=action
             )
-
-            if not permission_result['allowed']:
-                return JsonResponse(
-                    {
-                        'error': 'Forbidden',
-                        'detail': permission_result['message']
-                    },
-                    status=403
-                )
-            
-            request.requires_owner_filter = permission_result.get('requires_filter', False)
+            error_response = _apply_permission_result(request, permission_result)
+            if error_response:
+                return error_response
 
             return view_func(request, *args, **kwargs)
 
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def scope_to_owner(request, source, owner_field='owner_id'):
+    """
+    Применяет решение require_permission ("только свои") к источнику данных
+    до его чтения: QuerySet получает filter(owner_id=...) на стороне БД,
+    из коллекции в памяти выбираются только объекты пользователя без копии всей коллекции.
+    """
+    if not getattr(request, 'requires_owner_filter', False):
+        return source
+
+    if isinstance(source, models.QuerySet):
+        return source.filter(**{owner_field: request.user.id})
+
+    return [item for item in source if item.get(owner_field) == request.user.id]
@@ -0,0 +1,265 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from authentication.metrics import registry
+from authorization.models import AccessRule, BusinessElement, PolicyVersion, Role
+
+POLICY_VERSION_CACHE_KEY = 'rbac:policy-version'
+
+# Системные пути не могут принадлежать бизнес-элементу: endpoint '/' или '/api/'
+# иначе перехватил бы админку и вход, и администраторы потеряли бы доступ
+RESERVED_ENDPOINTS = ('/api/auth/', '/api/admin/', '/admin/', '/metrics')
+SNAPSHOT_FORMAT = 1
+
+
+def _bit(field):
+    return 1 << AccessRule.PERMISSION_FIELDS.index(field)
+
+
+READ = _bit('read_permission')
+READ_ALL = _bit('read_all_permission')
+CREATE = _bit('create_permission')
+UPDATE = _bit('update_permission')
+UPDATE_ALL = _bit('update_all_permission')
+DELETE = _bit('delete_permission')
+DELETE_ALL = _bit('delete_all_permission')
+
+# action -> (бит "свои", бит "все")
+ACTION_BITS = {
+    'read': (READ, READ_ALL),
+    'update': (UPDATE, UPDATE_ALL),
+    'delete': (DELETE, DELETE_ALL),
+}
+
+
+class PermissionMatrix:
+    """
+    Скомпилированная политика RBAC: одна битовая маска на пару (role_id, element_id).
+    Объект неизменяем - при изменении политики строится новый и подменяется целиком.
+    """
+
+    def __init__(self, element_ids, role_names, masks, endpoints=None):
+        self.element_ids = element_ids
+        self.role_names = role_names
+        self.masks = masks
+        self.endpoints = endpoints or {}
+        self.role_masks = {}
+        for (role_id, element_id), mask in masks.items():
+            self.role_masks.setdefault(role_id, {})[element_id] = mask
+        self.endpoint_trie = self._compile_endpoints(self.endpoints, element_ids)
+
+    @classmethod
+    def load(cls):
+        element_ids = {}
+        endpoints = {}
+        for name, element_id, endpoint in BusinessElement.objects.values_list('name', 'id', 'endpoint'):
+            element_ids[name] = element_id
+            if endpoint:
+                endpoints[name] = endpoint
+        role_names = dict(Role.objects.values_list('id', 'name'))
+        masks = {
+            (role_id, element_id): mask
+            for role_id, element_id, mask in AccessRule.objects.values_list(
+                'role_id', 'element_id', 'permission_mask'
+            )
+        }
+        return cls(element_ids, role_names, masks, endpoints)
+
+    def to_snapshot(self, version):
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'version': version,
+            'elements': [
+                [element_id, name, self.endpoints.get(name)]
+                for name, element_id in self.element_ids.items()
+            ],
+            'roles': [[role_id, name] for role_id, name in self.role_names.items()],
+            'rules': [
+                [role_id, element_id, mask]
+                for (role_id, element_id), mask in self.masks.items()
+            ],
+        }
+
+    @classmethod
+    def from_snapshot(cls, data):
+        element_ids = {}
+        endpoints = {}
+        for element_id, name, endpoint in data['elements']:
+            element_ids[name] = element_id
+            if endpoint:
+                endpoints[name] = endpoint
+        role_names = {role_id: name for role_id, name in data['roles']}
+        masks = {(role_id, element_id): mask for role_id, element_id, mask in data['rules']}
+        return cls(element_ids, role_names, masks, endpoints)
+
+    def resolve_path(self, path):
+        """
+        Элемент, которому принадлежит путь: самый длинный endpoint-префикс
+        по целым сегментам. Возвращает (element_id, element_name) или None.
+        """
+        node = self.endpoint_trie
+        match = node.get(None)
+        for segment in _path_segments(path):
+            node = node.get(segment)
+            if node is None:
+                break
+            match = node.get(None, match)
+        return match
+
+    @staticmethod
+    def _compile_endpoints(endpoints, element_ids):
+        # Дерево по сегментам пути; ключ None хранит элемент, чей endpoint здесь заканчивается
+        trie = {}
+        for name, endpoint in endpoints.items():
+            if is_reserved_endpoint(endpoint):
+                continue
+            node = trie
+            for segment in _path_segments(endpoint):
+                node = node.setdefault(segment, {})
+            node[None] = (element_ids[name], name)
+        return trie
+
+
+def is_reserved_endpoint(endpoint):
+    """endpoint совпадает с системным путем, вложен в него или является его префиксом"""
+    segments = _path_segments(endpoint)
+    for reserved in RESERVED_ENDPOINTS:
+        reserved_segments = _path_segments(reserved)
+        common = min(len(segments), len(reserved_segments))
+        if segments[:common] == reserved_segments[:common]:
+            return True
+    return False
+
+
+def _path_segments(path):
+    return [segment for segment in path.split('/') if segment]
+
+
+def current_policy_version():
+    alias = settings.RBAC_POLICY_CACHE_ALIAS
+    if alias:
+        version = caches[alias].get(POLICY_VERSION_CACHE_KEY)
+        if version is not None:
+            return version
+
+    version = PolicyVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    if alias:
+        caches[alias].add(POLICY_VERSION_CACHE_KEY, version, settings.RBAC_POLICY_CACHE_TTL)
+    return version
+
+
+def bump_policy_version():
+    # Выполняется в транзакции изменения, поэтому версия меняется вместе с данными
+    updated = PolicyVersion.objects.filter(pk=1).update(
+        version=F('version') + 1,
+        updated_at=timezone.now()
+    )
+    if not updated:
+        PolicyVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    transaction.on_commit(_policy_version_committed)
+
+
+def export_snapshot(path):
+    """Пишет политику в файл снимка атомарно; возвращает (версия, матрица)."""
+    # Как и в PolicyStore, версия читается до данных
+    version = current_policy_version()
+    matrix = PermissionMatrix.load()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.policy-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(matrix.to_snapshot(version), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return version, matrix
+
+
+def load_snapshot(path):
+    """(версия, матрица) из файла снимка или None, если файла нет или он не читается."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('format') != SNAPSHOT_FORMAT:
+            return None
+        return data['version'], PermissionMatrix.from_snapshot(data)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _policy_version_committed():
+    if settings.RBAC_POLICY_CACHE_ALIAS:
+        caches[settings.RBAC_POLICY_CACHE_ALIAS].delete(POLICY_VERSION_CACHE_KEY)
+    policy_store.invalidate()
+
+
+class PolicyStore:
+    """
+    Матрица прав процесса. Версия политики сверяется не чаще раза в check_interval
+    секунд, матрица перечитывается только если версия изменилась.
+    При старте процесса матрица берется из снимка (export_policy), если его версия актуальна.
+    """
+
+    def __init__(self, check_interval, snapshot_path=None):
+        self.check_interval = check_interval
+        self.snapshot_path = snapshot_path
+        self.version = None
+        self._matrix = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        matrix = self._matrix
+        if matrix is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return matrix
+        return self._refresh()
+
+    async def aget(self):
+        matrix = self._matrix
+        if matrix is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return matrix
+        return await sync_to_async(self._refresh)()
+
+    def invalidate(self):
+        # Следующий get() соберет новую матрицу; уже выданные ссылки остаются согласованными
+        with self._lock:
+            self._matrix = None
+
+    def _refresh(self):
+        with self._lock:
+            # Версия читается до загрузки: матрица не может оказаться старше своей версии
+            version = current_policy_version()
+            if self._matrix is None or version != self.version:
+                self._matrix = self._load(version)
+                self.version = version
+            self._checked_at = time.monotonic()
+            return self._matrix
+
+    def _load(self, version):
+        # Снимок нужен только для холодного старта; устаревший игнорируется
+        if self.snapshot_path and self.version is None:
+            snapshot = load_snapshot(self.snapshot_path)
+            if snapshot is not None and snapshot[0] == version:
+                return snapshot[1]
+        return PermissionMatrix.load()
+
+
+policy_store = PolicyStore(
+    check_interval=settings.RBAC_POLICY_CHECK_INTERVAL,
+    snapshot_path=settings.RBAC_POLICY_SNAPSHOT
+)
+
+registry.register_stats('rbac_policy', 'Loaded RBAC policy', lambda: {'version': policy_store.version or 0})
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from authorization.models import Role, BusinessElement, AccessRule
+from authorization.policy import RESERVED_ENDPOINTS, is_reserved_endpoint
 
 
 class RoleSerializer(serializers.ModelSerializer):
@@ -10,6 +12,19 @@ class RoleSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class RoleCloneSerializer(serializers.Serializer):
+    
+    name = serializers.CharField(max_length=50, validators=[UniqueValidator(queryset=Role.objects.all())])
+    description = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    overrides = serializers.DictField(child=serializers.BooleanField(), required=False)
+    
+    def validate_overrides(self, overrides):
+        unknown = set(overrides) - set(AccessRule.PERMISSION_FIELDS)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown permission fields: {', '.join(sorted(unknown))}")
+        return overrides
+
+
 class BusinessElementSerializer(serializers.ModelSerializer):
     
     class Meta:
@@ -17,6 +32,17 @@ class BusinessElementSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'endpoint', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+    def validate_endpoint(self, endpoint):
+        if not endpoint:
+            return endpoint
+        if not endpoint.startswith('/'):
+            raise serializers.ValidationError('Endpoint must start with "/"')
+        if is_reserved_endpoint(endpoint):
+            raise serializers.ValidationError(
+                f'Endpoint overlaps a reserved path ({", ".join(RESERVED_ENDPOINTS)})'
+            )
+        return endpoint
+
 
 class AccessRuleDetailSerializer(serializers.ModelSerializer):
     
@@ -33,9 +59,10 @@ class AccessRuleDetailSerializer(serializers.ModelSerializer):
             'create_permission',
             'update_permission', 'update_all_permission',
             'delete_permission', 'delete_all_permission',
+            'permission_mask',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'role_name', 'element_name', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'role_name', 'element_name', 'permission_mask', 'created_at', 'updated_at']
 
 
 class AccessRuleCreateUpdateSerializer(serializers.ModelSerializer):
@@ -60,4 +87,59 @@ class AccessRuleCreateUpdateSerializer(serializers.ModelSerializer):
                     f"Access rule for role '{role.name}' and element '{element.name}' already exists"
                 )
         
-        return data
\ No newline at end of file
+        return data
+
+
+class AccessRuleBulkItemSerializer(serializers.Serializer):
+    
+    role = serializers.IntegerField()
+    element = serializers.IntegerField()
+    read_permission = serializers.BooleanField(default=False)
+    read_all_permission = serializers.BooleanField(default=False)
+    create_permission = serializers.BooleanField(default=False)
+    update_permission = serializers.BooleanField(default=False)
+    update_all_permission = serializers.BooleanField(default=False)
+    delete_permission = serializers.BooleanField(default=False)
+    delete_all_permission = serializers.BooleanField(default=False)
+
+
+class AccessRuleBulkSerializer(serializers.Serializer):
+    
+    rules = serializers.ListField(child=AccessRuleBulkItemSerializer(), allow_empty=False, max_length=5000)
+    
+    def validate_rules(self, rules):
+        pairs = [(rule['role'], rule['element']) for rule in rules]
+        if len(set(pairs)) != len(pairs):
+            raise serializers.ValidationError("Duplicate (role, element) pairs")
+        
+        # Существование ролей и элементов - по одному запросу на таблицу
+        role_ids = {role_id for role_id, _ in pairs}
+        element_ids = {element_id for _, element_id in pairs}
+        missing_roles = role_ids - set(Role.objects.filter(id__in=role_ids).values_list('id', flat=True))
+        missing_elements = element_ids - set(
+            BusinessElement.objects.filter(id__in=element_ids).values_list('id', flat=True)
+        )
+        
+        errors = []
+        if missing_roles:
+            errors.append(f"Unknown roles: {', '.join(map(str, sorted(missing_roles)))}")
+        if missing_elements:
+            errors.append(f"Unknown business elements: {', '.join(map(str, sorted(missing_elements)))}")
+        if errors:
+            raise serializers.ValidationError(errors)
+        
+        return rules
+
+
+class SessionRevokeSerializer(serializers.Serializer):
+    
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    role = serializers.PrimaryKeyRelatedField(queryset=Role.objects.all(), required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    ip_address = serializers.IPAddressField(required=False)
+    
+    def validate(self, data):
+        if not any(data.values()):
+            raise serializers.ValidationError("At least one filter is required")
+        return data
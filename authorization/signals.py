@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from authorization.models import AccessRule, BusinessElement, Role
+from authorization.policy import bump_policy_version
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=BusinessElement)
+@receiver(post_delete, sender=BusinessElement)
+@receiver(post_save, sender=AccessRule)
+@receiver(post_delete, sender=AccessRule)
+def policy_changed(sender, **kwargs):
+    bump_policy_version()
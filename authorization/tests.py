@@ -1,3 +1,541 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from authentication.models import Session, User
+from authorization.export import iter_export
+from authorization.models import AccessRule, BusinessElement, Role
+from authorization.pagination import _after, encode_cursor
+from authorization.permissions import PermissionChecker, scope_to_owner
+from authorization.policy import (
+    CREATE,
+    DELETE,
+    DELETE_ALL,
+    READ,
+    READ_ALL,
+    UPDATE,
+    UPDATE_ALL,
+    PermissionMatrix,
+    PolicyStore,
+    export_snapshot,
+    load_snapshot,
+    policy_store
+)
+
+
+def create_user(email, role):
+    return User.objects.create(
+        email=email, first_name='Test', last_name='User', password_hash='', role=role
+    )
+
+
+class DecideDescribeTests(SimpleTestCase):
+    # Сообщения должны совпадать с прежним PermissionChecker.check_permission
+
+    def setUp(self):
+        self.user = User(id=10, role_id=1)
+
+    def evaluate(self, mask, action, obj_owner_id=None):
+        matrix = PermissionMatrix(
+            element_ids={'orders': 1},
+            role_names={1: 'user'},
+            masks={} if mask is None else {(1, 1): mask}
+        )
+        return PermissionChecker.evaluate(matrix, self.user, 'orders', action, obj_owner_id)
+
+    def test_messages_match_previous_checker(self):
+        cases = [
+            (READ_ALL, 'read', None, True, False, 'Full read access'),
+            (READ, 'read', None, True, True, 'Read own only'),
+            (READ, 'read', 10, True, False, 'Access granted'),
+            (READ, 'read', 11, False, False, 'Access denied - not owner'),
+            (CREATE, 'read', None, False, False, 'No read permission'),
+            (UPDATE_ALL, 'update', 11, True, False, 'Full update access'),
+            (UPDATE, 'update', None, True, True, 'Update own only'),
+            (UPDATE, 'update', 11, False, False, 'Access denied - not owner'),
+            (READ_ALL, 'update', None, False, False, 'No update permission'),
+            (DELETE_ALL, 'delete', 11, True, False, 'Full delete access'),
+            (DELETE, 'delete', None, True, True, 'Delete own only'),
+            (DELETE, 'delete', 10, True, False, 'Access granted'),
+            (READ, 'delete', None, False, False, 'No delete permission'),
+            (CREATE, 'create', None, True, False, 'Access granted'),
+            (READ_ALL, 'create', None, False, False, 'Access denied'),
+            (None, 'read', None, False, False, 'No access rule for role "user" and element "orders"'),
+        ]
+        for mask, action, owner_id, allowed, requires_filter, message in cases:
+            with self.subTest(mask=mask, action=action, owner_id=owner_id):
+                self.assertEqual(
+                    self.evaluate(mask, action, owner_id),
+                    {'allowed': allowed, 'requires_filter': requires_filter, 'message': message}
+                )
+
+    def test_unknown_element(self):
+        matrix = PermissionMatrix({'orders': 1}, {1: 'user'}, {})
+        result = PermissionChecker.evaluate(matrix, self.user, 'stores', 'read')
+        self.assertEqual(result['message'], 'Business element "stores" not found')
+        self.assertFalse(result['allowed'])
+
+
+class PolicyStoreTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name='user')
+        cls.element = BusinessElement.objects.create(name='orders', endpoint='/api/orders/')
+        cls.rule = AccessRule.objects.create(role=cls.role, element=cls.element, read_permission=True)
+
+    def setUp(self):
+        policy_store.invalidate()
+
+    def test_rule_save_invalidates_matrix(self):
+        matrix = policy_store.get()
+        self.assertEqual(matrix.masks[(self.role.pk, self.element.pk)], READ)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rule.read_all_permission = True
+            self.rule.save()
+
+        matrix = policy_store.get()
+        self.assertEqual(matrix.masks[(self.role.pk, self.element.pk)], READ | READ_ALL)
+
+
+class CheckManyTests(SimpleTestCase):
+
+    def test_evaluate_many_without_messages(self):
+        matrix = PermissionMatrix({'orders': 1}, {1: 'user'}, {(1, 1): READ | CREATE})
+        results = PermissionChecker.evaluate_many(
+            matrix, User(id=10, role_id=1),
+            [('orders', 'read', None), ('orders', 'create', None), ('stores', 'read', None)]
+        )
+        self.assertEqual(results, [(True, True), (True, False), (False, False)])
+
+    def test_evaluate_many_with_messages(self):
+        matrix = PermissionMatrix({'orders': 1}, {1: 'user'}, {(1, 1): READ})
+        results = PermissionChecker.evaluate_many(
+            matrix, User(id=10, role_id=1), [('orders', 'read', 10), ('orders', 'read', 11)],
+            with_messages=True
+        )
+        self.assertEqual(
+            [result['message'] for result in results], ['Access granted', 'Access denied - not owner']
+        )
+
+
+class ScopeToOwnerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='user')
+        cls.owner = create_user('owner@example.com', role)
+        cls.other = create_user('other@example.com', role)
+        Session.create_session(cls.owner)
+        Session.create_session(cls.other)
+
+    def request(self, requires_owner_filter):
+        return SimpleNamespace(user=self.owner, requires_owner_filter=requires_owner_filter)
+
+    def test_queryset_is_filtered_in_database(self):
+        sessions = scope_to_owner(self.request(True), Session.objects.all(), owner_field='user_id')
+        self.assertIn('"user_id" =', str(sessions.query))
+        self.assertEqual([session.user_id for session in sessions], [self.owner.pk])
+
+    def test_collection_is_filtered(self):
+        items = [{'id': 1, 'owner_id': self.owner.pk}, {'id': 2, 'owner_id': self.other.pk}]
+        self.assertEqual(scope_to_owner(self.request(True), items), [items[0]])
+
+    def test_full_access_is_not_filtered(self):
+        sessions = Session.objects.all()
+        self.assertIs(scope_to_owner(self.request(False), sessions, owner_field='user_id'), sessions)
+
+
+class PermissionMaskTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name='user')
+        cls.element = BusinessElement.objects.create(name='orders', endpoint='/api/orders/')
+
+    def test_bit_order_follows_permission_fields(self):
+        bits = [READ, READ_ALL, CREATE, UPDATE, UPDATE_ALL, DELETE, DELETE_ALL]
+        for index, (field, bit) in enumerate(zip(AccessRule.PERMISSION_FIELDS, bits)):
+            with self.subTest(field=field):
+                self.assertEqual(bit, 1 << index)
+                self.assertEqual(AccessRule.mask_for_fields([field]), bit)
+
+    def test_save_recomputes_mask(self):
+        rule = AccessRule.objects.create(
+            role=self.role, element=self.element, read_permission=True, delete_all_permission=True
+        )
+        self.assertEqual(rule.permission_mask, READ | DELETE_ALL)
+
+        rule.delete_all_permission = False
+        rule.save(update_fields=['delete_all_permission'])
+        rule.refresh_from_db()
+        self.assertEqual(rule.permission_mask, READ)
+
+    def test_update_cannot_desync_mask(self):
+        rule = AccessRule.objects.create(role=self.role, element=self.element, read_permission=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AccessRule.objects.filter(pk=rule.pk).update(read_all_permission=True)
+
+    def test_flag_queries(self):
+        AccessRule.objects.create(
+            role=self.role, element=self.element, read_permission=True, delete_all_permission=True
+        )
+        rules = AccessRule.objects.filter(element=self.element)
+        self.assertTrue(rules.with_all_flags('read_permission', 'delete_all_permission').exists())
+        self.assertFalse(rules.with_all_flags('read_permission', 'create_permission').exists())
+        self.assertTrue(rules.with_any_flags('create_permission', 'delete_all_permission').exists())
+        self.assertFalse(rules.with_any_flags('create_permission', 'update_permission').exists())
+
+
+class AdminApiTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_role = Role.objects.create(name='admin')
+        cls.user_role = Role.objects.create(name='user')
+        cls.orders = BusinessElement.objects.create(name='orders', endpoint='/api/orders/')
+        cls.products = BusinessElement.objects.create(name='products', endpoint='/api/products/')
+        cls.admin = create_user('admin@example.com', cls.admin_role)
+
+    def setUp(self):
+        policy_store.invalidate()
+        token = Session.create_session(self.admin).token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+
+class GranteesTests(AdminApiTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        guest_role = Role.objects.create(name='guest')
+        AccessRule.objects.create(role=cls.admin_role, element=cls.orders, read_all_permission=True)
+        AccessRule.objects.create(role=cls.user_role, element=cls.orders, read_permission=True)
+        AccessRule.objects.create(role=guest_role, element=cls.orders, create_permission=True)
+        cls.users = [create_user(f'user{i}@example.com', cls.user_role) for i in range(3)]
+        create_user('guest@example.com', guest_role)
+        inactive = create_user('inactive@example.com', cls.user_role)
+        User.objects.filter(pk=inactive.pk).update(is_active=False)
+
+    def grantees(self, query=''):
+        return self.client.get(f'/api/admin/business-elements/{self.orders.pk}/grantees/?{query}', **self.auth)
+
+    def test_roles_and_scopes(self):
+        data = self.grantees('action=read').json()
+        self.assertEqual(
+            {(role['role_name'], role['scope']) for role in data['roles']},
+            {('admin', 'all'), ('user', 'own')}
+        )
+        self.assertEqual(
+            [(user['email'], user['scope']) for user in data['results']],
+            [('admin@example.com', 'all')] + [(user.email, 'own') for user in self.users]
+        )
+
+    def test_pages(self):
+        seen = []
+        cursor = None
+        while True:
+            page = self.grantees('action=read&limit=2' + (f'&cursor={cursor}' if cursor else '')).json()
+            seen.extend(user['id'] for user in page['results'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [self.admin.pk] + [user.pk for user in self.users])
+
+    def test_roles_are_paged_separately_and_merged_by_id(self):
+        # id ролей чередуются, порядок страницы задает слияние, а не один ORDER BY по IN (...)
+        more = [
+            create_user(f'{role.name}-{i}@example.org', role)
+            for i in range(2) for role in (self.admin_role, self.user_role)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            page = self.grantees('action=read&limit=3&count=exact').json()
+        user_queries = [query['sql'] for query in queries.captured_queries if 'FROM "users"' in query['sql']]
+        self.assertFalse(any(' IN (' in sql for sql in user_queries))
+        expected = sorted([self.admin.pk] + [user.pk for user in self.users + more])
+        self.assertEqual([user['id'] for user in page['results']], expected[:3])
+        self.assertEqual(page['count'], len(expected))
+
+    def test_unknown_action(self):
+        self.assertEqual(self.grantees('action=publish').status_code, 400)
+
+
+class ResolvePathTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.orders = BusinessElement.objects.create(name='orders', endpoint='/api/orders/')
+
+    def test_longest_endpoint_prefix(self):
+        BusinessElement.objects.create(name='order-items', endpoint='/api/orders/items/')
+        matrix = PermissionMatrix.load()
+        self.assertEqual(matrix.resolve_path('/api/orders/5/')[1], 'orders')
+        self.assertEqual(matrix.resolve_path('/api/orders/items/7/')[1], 'order-items')
+        self.assertIsNone(matrix.resolve_path('/api/ordersx/'))
+
+    def test_reserved_endpoints_are_ignored(self):
+        BusinessElement.objects.create(name='everything', endpoint='/api/')
+        matrix = PermissionMatrix.load()
+        self.assertIsNone(matrix.resolve_path('/api/admin/roles/'))
+        self.assertEqual(matrix.resolve_path('/api/orders/5/'), (self.orders.pk, 'orders'))
+
+
+class BusinessElementEndpointTests(AdminApiTestCase):
+
+    def create(self, endpoint):
+        return self.client.post(
+            '/api/admin/business-elements/', {'name': 'tickets', 'endpoint': endpoint},
+            content_type='application/json', **self.auth
+        )
+
+    def test_reserved_and_relative_endpoints_rejected(self):
+        for endpoint in ('/', '/api/', '/api/admin/x/', 'api/tickets/'):
+            with self.subTest(endpoint=endpoint):
+                self.assertEqual(self.create(endpoint).status_code, 400)
+
+    def test_endpoint_accepted(self):
+        self.assertEqual(self.create('/api/tickets/').status_code, 201)
+
+
+class PolicySnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name='user')
+        cls.element = BusinessElement.objects.create(name='orders', endpoint='/api/orders/')
+        cls.rule = AccessRule.objects.create(role=cls.role, element=cls.element, read_permission=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'policy.json')
+
+    def test_round_trip(self):
+        version, matrix = export_snapshot(self.path)
+        loaded_version, loaded = load_snapshot(self.path)
+        self.assertEqual(loaded_version, version)
+        self.assertEqual(loaded.masks, matrix.masks)
+        self.assertEqual(loaded.role_names, matrix.role_names)
+        self.assertEqual(loaded.element_ids, matrix.element_ids)
+        self.assertEqual(loaded.endpoints, {'orders': '/api/orders/'})
+
+    def test_current_snapshot_skips_matrix_queries(self):
+        export_snapshot(self.path)
+        store = PolicyStore(check_interval=60, snapshot_path=self.path)
+        # Только чтение версии политики
+        with self.assertNumQueries(1):
+            matrix = store.get()
+        self.assertEqual(matrix.masks, {(self.role.pk, self.element.pk): READ})
+
+    def test_stale_snapshot_falls_back_to_database(self):
+        export_snapshot(self.path)
+        self.rule.read_all_permission = True
+        self.rule.save()
+
+        matrix = PolicyStore(check_interval=60, snapshot_path=self.path).get()
+        self.assertEqual(matrix.masks, {(self.role.pk, self.element.pk): READ | READ_ALL})
+
+    def test_unreadable_snapshot(self):
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+        self.assertIsNone(load_snapshot(self.path))
+
+
+class KeysetPaginationTests(AdminApiTestCase):
+
+    def walk(self, url):
+        seen = []
+        cursor = None
+        while True:
+            page = self.client.get(url + (f'&cursor={cursor}' if cursor else ''), **self.auth).json()
+            self.assertLessEqual(len(page['results']), 2)
+            seen.extend(page['results'])
+            cursor = page['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_roles_pages(self):
+        for i in range(5):
+            Role.objects.create(name=f'role-{i}')
+        seen = [role['id'] for role in self.walk('/api/admin/roles/?limit=2')]
+        self.assertEqual(seen, list(Role.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_access_rules_pages_by_element_and_role(self):
+        for role in [Role.objects.create(name=f'role-{i}') for i in range(3)] + [self.user_role]:
+            for element in (self.orders, self.products):
+                AccessRule.objects.create(role=role, element=element, read_permission=True)
+
+        seen = [
+            (rule['role'], rule['element'])
+            for rule in self.walk(f'/api/admin/access-rules/?element_id={self.orders.pk}&limit=2')
+        ]
+        self.assertEqual(seen, list(
+            AccessRule.objects.filter(element=self.orders).order_by('role_id').values_list('role_id', 'element_id')
+        ))
+
+    def test_multi_column_pages(self):
+        for role in [Role.objects.create(name=f'role-{i}') for i in range(3)]:
+            for element in (self.orders, self.products):
+                AccessRule.objects.create(role=role, element=element, read_permission=True)
+
+        seen = [(rule['role'], rule['element']) for rule in self.walk('/api/admin/access-rules/?limit=2')]
+        self.assertEqual(seen, list(
+            AccessRule.objects.order_by('role_id', 'element_id').values_list('role_id', 'element_id')
+        ))
+
+    def test_cursor_condition_bounds_first_column(self):
+        rules = AccessRule.objects.filter(_after(('role_id', 'element_id'), [3, 7]))
+        where = str(rules.query).split('WHERE', 1)[1]
+        self.assertTrue(where.strip().startswith('("access_rules"."role_id" >= 3 AND'))
+
+    def test_invalid_cursor(self):
+        for cursor in ('zzz', encode_cursor(['a']), encode_cursor([1, 2])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/admin/roles/?cursor={cursor}', **self.auth)
+                self.assertEqual(response.status_code, 400)
+
+
+class BulkUpsertTests(AdminApiTestCase):
+
+    def bulk(self, rules):
+        return self.client.post(
+            '/api/admin/access-rules/bulk/', {'rules': rules}, content_type='application/json', **self.auth
+        )
+
+    def test_outcomes(self):
+        AccessRule.objects.create(role=self.user_role, element=self.orders, read_permission=True)
+        AccessRule.objects.create(role=self.user_role, element=self.products, read_all_permission=True)
+
+        response = self.bulk([
+            {'role': self.user_role.pk, 'element': self.orders.pk, 'read_permission': True, 'create_permission': True},
+            {'role': self.user_role.pk, 'element': self.products.pk, 'read_all_permission': True},
+            {'role': self.admin_role.pk, 'element': self.orders.pk, 'read_all_permission': True},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['created'], data['updated'], data['unchanged']), (1, 1, 1))
+        self.assertEqual([result['status'] for result in data['results']], ['updated', 'unchanged', 'created'])
+        rule = AccessRule.objects.get(role=self.user_role, element=self.orders)
+        self.assertTrue(rule.create_permission)
+        self.assertEqual(rule.permission_mask, READ | CREATE)
+
+    def test_duplicate_pairs_rejected(self):
+        pair = {'role': self.user_role.pk, 'element': self.orders.pk}
+        self.assertEqual(self.bulk([pair, pair]).status_code, 400)
+
+
+class ConditionalGetTests(AdminApiTestCase):
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/admin/roles/', **self.auth)['ETag']
+
+        response = self.client.get('/api/admin/roles/', HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 304)
+
+        Role.objects.create(name='auditor')
+        response = self.client.get('/api/admin/roles/', HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_write_ignores_if_none_match(self):
+        etag = self.client.get('/api/admin/roles/', **self.auth)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/api/admin/roles/', {'name': 'auditor'}, content_type='application/json',
+                HTTP_IF_NONE_MATCH=etag, **self.auth
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('ETag', response)
+        # Версия политики только поднимается после записи, но не читается для ETag
+        self.assertFalse([
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and '"policy_version"' in query['sql']
+        ])
+
+    def test_not_modified_requires_admin(self):
+        etag = self.client.get('/api/admin/roles/', **self.auth)['ETag']
+        response = self.client.get('/api/admin/roles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 401)
+
+
+class CopyToRoleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name='user')
+        cls.orders = BusinessElement.objects.create(name='orders', endpoint='/api/orders/')
+        cls.products = BusinessElement.objects.create(name='products', endpoint='/api/products/')
+        AccessRule.objects.create(
+            role=cls.role, element=cls.orders,
+            read_permission=True, update_all_permission=True, delete_all_permission=True
+        )
+        AccessRule.objects.create(role=cls.role, element=cls.products, read_all_permission=True)
+
+    def test_overrides(self):
+        target = Role.objects.create(name='user-readonly')
+        copied = AccessRule.objects.filter(role=self.role).copy_to_role(
+            target, {'update_all_permission': False, 'delete_all_permission': False, 'create_permission': True}
+        )
+
+        self.assertEqual(copied, 2)
+        rules = {rule.element_id: rule for rule in AccessRule.objects.filter(role=target)}
+        self.assertEqual(rules[self.orders.pk].permission_mask, READ | CREATE)
+        self.assertEqual(rules[self.products.pk].permission_mask, READ_ALL | CREATE)
+        for rule in rules.values():
+            self.assertEqual(rule.permission_mask, rule.get_permission_mask())
+
+    def test_plain_copy(self):
+        target = Role.objects.create(name='user-copy')
+        AccessRule.objects.filter(role=self.role).copy_to_role(target)
+        self.assertEqual(
+            sorted(AccessRule.objects.filter(role=target).values_list('element_id', 'permission_mask')),
+            sorted(AccessRule.objects.filter(role=self.role).values_list('element_id', 'permission_mask'))
+        )
+
+
+class ExportTests(AdminApiTestCase):
+
+    def export(self, table, fmt, **headers):
+        return self.client.get(f'/api/admin/export/{table}/?format={fmt}', **(headers or self.auth))
+
+    def test_csv(self):
+        response = self.export('users', 'csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ['id', 'email'])
+        self.assertNotIn('password_hash', rows[0])
+        self.assertEqual([row[1] for row in rows[1:]], ['admin@example.com'])
+
+    def test_ndjson(self):
+        AccessRule.objects.create(role=self.user_role, element=self.orders, read_all_permission=True)
+        response = self.export('access-rules', 'ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rule = json.loads(lines[0])
+        self.assertEqual((rule['role_id'], rule['permission_mask']), (self.user_role.pk, READ_ALL))
+
+    def test_sessions_exclude_token_digest(self):
+        content = b''.join(self.export('sessions', 'ndjson').streaming_content).decode()
+        self.assertNotIn('token_digest', content)
+        self.assertEqual(json.loads(content.splitlines()[0])['user_id'], self.admin.pk)
+
+    def test_chunks(self):
+        create_user('user@example.com', self.user_role)
+        chunks = list(iter_export('users', 'csv', chunk_size=1))
+        self.assertEqual(len(chunks), 3)
+
+    def test_errors(self):
+        self.assertEqual(self.export('roles', 'csv').status_code, 404)
+        self.assertEqual(self.export('users', 'xml').status_code, 400)
+        user_token = Session.create_session(create_user('user@example.com', self.user_role)).token
+        response = self.export('users', 'csv', HTTP_AUTHORIZATION=f'Bearer {user_token}')
+        self.assertEqual(response.status_code, 403)
@@ -6,11 +6,18 @@ app_name = 'authorization'
 urlpatterns = [
     path('roles/', views.roles_list_view, name='roles_list'),
     path('roles/<int:pk>/', views.role_detail_view, name='role_detail'),
+    path('roles/<int:pk>/clone/', views.role_clone_view, name='role_clone'),
     path('roles/<int:pk>/access-rules/', views.role_access_rules_view, name='role_access_rules'),
     
     path('business-elements/', views.business_elements_list_view, name='business_elements_list'),
     path('business-elements/<int:pk>/', views.business_element_detail_view, name='business_element_detail'),
+    path('business-elements/<int:pk>/grantees/', views.element_grantees_view, name='element_grantees'),
     
     path('access-rules/', views.access_rules_list_view, name='access_rules_list'),
+    path('access-rules/bulk/', views.access_rules_bulk_view, name='access_rules_bulk'),
     path('access-rules/<int:pk>/', views.access_rule_detail_view, name='access_rule_detail'),
+    
+    path('sessions/revoke/', views.sessions_revoke_view, name='sessions_revoke'),
+    
+    path('export/<slug:table>/', views.export_view, name='export'),
 ]
\ No newline at end of file
@@ -1,14 +1,28 @@
+import hashlib
+from functools import wraps
+
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import JsonResponse
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 
+from authentication.models import Session, User
+from authorization.export import CONTENT_TYPES, EXPORTS, FORMATS, aiter_export, iter_export
 from authorization.models import Role, BusinessElement, AccessRule
+from authorization.pagination import InvalidPage, keyset_page, merged_keyset_page
+from authorization.policy import bump_policy_version, current_policy_version
 from authorization.serializers import (
     RoleSerializer,
+    RoleCloneSerializer,
     BusinessElementSerializer,
     AccessRuleDetailSerializer,
-    AccessRuleCreateUpdateSerializer
+    AccessRuleCreateUpdateSerializer,
+    AccessRuleBulkSerializer,
+    SessionRevokeSerializer
 )
 
 
@@ -34,16 +48,44 @@ def require_admin(view_func):
     
     return wrapper
 
+def _policy_etag(request, *args, **kwargs):
+    # Роли, элементы и правила меняются только вместе с версией политики;
+    # путь с параметрами и Accept отличают страницы и форматы одного списка
+    variant = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+    return f'{current_policy_version()}-{hashlib.sha256(variant.encode()).hexdigest()[:16]}'
+
+
+def policy_conditional(view_func):
+    """
+    ETag по версии политики: при совпадении If-None-Match ответ 304 отдается
+    до выполнения view, без запросов списка и сериализации.
+    Только для GET/HEAD: запись не читает версию и не получает 412 по If-None-Match.
+    """
+    conditional_view = cache_control(private=True, max_age=0, must_revalidate=True)(
+        condition(etag_func=_policy_etag)(view_func)
+    )
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return conditional_view(request, *args, **kwargs)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
 @api_view(['GET', 'POST'])
 @require_admin
+@policy_conditional
 def roles_list_view(request):
     if request.method == 'GET':
-        roles = Role.objects.all().order_by('id')
-        serializer = RoleSerializer(roles, many=True)
-        return Response({
-            'count': roles.count(),
-            'results': serializer.data
-        })
+        try:
+            page = keyset_page(
+                request, Role.objects.all(), ('id',),
+                lambda rows: RoleSerializer(rows, many=True).data
+            )
+        except InvalidPage as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(page)
     
     elif request.method == 'POST':
         serializer = RoleSerializer(data=request.data)
@@ -82,6 +124,35 @@ def role_detail_view(request, pk):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['POST'])
+@require_admin
+def role_clone_view(request, pk):
+    """
+    POST /api/admin/roles/{id}/clone/ {"name": "...", "overrides": {"delete_all_permission": false}}
+    Новая роль с копией всех правил исходной; overrides применяется к каждой копии.
+    """
+    try:
+        source = Role.objects.get(pk=pk)
+    except Role.DoesNotExist:
+        return Response({'error': 'Role not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    serializer = RoleCloneSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    with transaction.atomic():
+        # Версию политики поднимает сигнал сохранения роли в этой же транзакции;
+        # правила копируются запросом без сигналов
+        role = Role.objects.create(name=data['name'], description=data.get('description'))
+        copied = AccessRule.objects.filter(role=source).copy_to_role(role, data.get('overrides'))
+    
+    return Response(
+        {**RoleSerializer(role).data, 'source': source.id, 'rules_copied': copied},
+        status=status.HTTP_201_CREATED
+    )
+
+
 @api_view(['GET'])
 @require_admin
 def role_access_rules_view(request, pk):
@@ -100,16 +171,73 @@ def role_access_rules_view(request, pk):
     })
 
 
+@api_view(['GET'])
+@require_admin
+def element_grantees_view(request, pk):
+    """
+    Кто может выполнить действие над элементом и в каком объеме:
+    GET /api/admin/business-elements/{id}/grantees/?action=update&cursor=...&limit=100
+    """
+    try:
+        element = BusinessElement.objects.get(pk=pk)
+    except BusinessElement.DoesNotExist:
+        return Response({'error': 'Business element not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    action = request.query_params.get('action', 'read')
+    if action not in AccessRule.ACTION_FIELDS:
+        return Response({'error': f'Unknown action "{action}"'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    roles = {
+        role_id: {'role_id': role_id, 'role_name': role_name, 'scope': AccessRule.scope_for(mask, action)}
+        for role_id, role_name, mask in AccessRule.objects.granting(element, action).values_list(
+            'role_id', 'role__name', 'permission_mask'
+        )
+    }
+    
+    try:
+        # Страница на каждую роль по индексу (role, is_active, id), слияние по id:
+        # при role_id IN (...) индекс не дает общего порядка по id
+        page = merged_keyset_page(
+            request,
+            [
+                User.objects.filter(role_id=role_id, is_active=True).values('id', 'email', 'role_id')
+                for role_id in roles
+            ],
+            'id',
+            lambda users: [
+                {
+                    'id': user['id'],
+                    'email': user['email'],
+                    'role': roles[user['role_id']]['role_name'],
+                    'scope': roles[user['role_id']]['scope'],
+                }
+                for user in users
+            ]
+        )
+    except InvalidPage as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'element': element.name,
+        'action': action,
+        'roles': list(roles.values()),
+        **page
+    })
+
+
 @api_view(['GET', 'POST'])
 @require_admin
+@policy_conditional
 def business_elements_list_view(request):
     if request.method == 'GET':
-        elements = BusinessElement.objects.all().order_by('id')
-        serializer = BusinessElementSerializer(elements, many=True)
-        return Response({
-            'count': elements.count(),
-            'results': serializer.data
-        })
+        try:
+            page = keyset_page(
+                request, BusinessElement.objects.all(), ('id',),
+                lambda rows: BusinessElementSerializer(rows, many=True).data
+            )
+        except InvalidPage as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(page)
     
     elif request.method == 'POST':
         serializer = BusinessElementSerializer(data=request.data)
@@ -145,6 +273,7 @@ def business_element_detail_view(request, pk):
 
 @api_view(['GET', 'POST'])
 @require_admin
+@policy_conditional
 def access_rules_list_view(request):
 
     if request.method == 'GET':
@@ -158,13 +287,15 @@ def access_rules_list_view(request):
         if element_id:
             access_rules = access_rules.filter(element_id=element_id)
         
-        access_rules = access_rules.order_by('role__name', 'element__name')
-        serializer = AccessRuleDetailSerializer(access_rules, many=True)
-        
-        return Response({
-            'count': access_rules.count(),
-            'results': serializer.data
-        })
+        # Порядок по (role_id, element_id) покрывается индексами, сортировка по именам через JOIN - нет
+        try:
+            page = keyset_page(
+                request, access_rules, ('role_id', 'element_id'),
+                lambda rows: AccessRuleDetailSerializer(rows, many=True).data
+            )
+        except InvalidPage as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(page)
     
     elif request.method == 'POST':
         serializer = AccessRuleCreateUpdateSerializer(data=request.data)
@@ -177,6 +308,75 @@ def access_rules_list_view(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@require_admin
+def access_rules_bulk_view(request):
+    """
+    Создание/обновление набора правил одним запросом:
+    POST /api/admin/access-rules/bulk/ {"rules": [{"role": 1, "element": 2, "read_permission": true, ...}]}
+    Не переданные флаги считаются false. Версия политики поднимается один раз.
+    """
+    serializer = AccessRuleBulkSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    rules = serializer.validated_data['rules']
+    results = []
+    changed = []
+    
+    with transaction.atomic():
+        existing = {
+            (role_id, element_id): mask
+            for role_id, element_id, mask in AccessRule.objects.filter(
+                role_id__in={rule['role'] for rule in rules},
+                element_id__in={rule['element'] for rule in rules}
+            ).values_list('role_id', 'element_id', 'permission_mask')
+        }
+        
+        for rule in rules:
+            flags = {field: rule[field] for field in AccessRule.PERMISSION_FIELDS}
+            mask = AccessRule.mask_from_flags(flags[field] for field in AccessRule.PERMISSION_FIELDS)
+            previous = existing.get((rule['role'], rule['element']))
+            
+            if previous is None:
+                outcome = 'created'
+            elif previous != mask:
+                outcome = 'updated'
+            else:
+                outcome = 'unchanged'
+            results.append({
+                'role': rule['role'],
+                'element': rule['element'],
+                'status': outcome,
+                'permission_mask': mask
+            })
+            
+            if outcome != 'unchanged':
+                changed.append(AccessRule(
+                    role_id=rule['role'],
+                    element_id=rule['element'],
+                    permission_mask=mask,
+                    **flags
+                ))
+        
+        if changed:
+            # INSERT ... ON CONFLICT (role_id, element_id) DO UPDATE; сигналы не отправляются,
+            # поэтому версия политики поднимается здесь один раз на весь набор
+            AccessRule.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=['role', 'element'],
+                update_fields=[*AccessRule.PERMISSION_FIELDS, 'permission_mask', 'updated_at']
+            )
+            bump_policy_version()
+    
+    summary = {outcome: 0 for outcome in ('created', 'updated', 'unchanged')}
+    for result in results:
+        summary[result['status']] += 1
+    
+    return Response({**summary, 'results': results})
+
+
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @require_admin
 def access_rule_detail_view(request, pk):
@@ -203,4 +403,48 @@ def access_rule_detail_view(request, pk):
     
     elif request.method == 'DELETE':
         access_rule.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['POST'])
+@require_admin
+def sessions_revoke_view(request):
+    serializer = SessionRevokeSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    role_id = data['role'].pk if data.get('role') else None
+    revoked = Session.objects.matching(
+        user_ids=data.get('user_ids'),
+        role_id=role_id,
+        created_after=data.get('created_after'),
+        created_before=data.get('created_before'),
+        ip_address=data.get('ip_address')
+    ).revoke(role_id=role_id)
+    
+    return Response({'revoked': revoked})
+
+
+@require_GET
+@require_admin
+def export_view(request, table):
+    """
+    Потоковая выгрузка таблицы: GET /api/admin/export/{users|sessions|access-rules}/?format=ndjson|csv
+    Ответ формируется по мере чтения курсора, память не зависит от размера таблицы.
+    """
+    if table not in EXPORTS:
+        return JsonResponse({'error': f'Unknown export "{table}"'}, status=404)
+    
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': f'Unsupported format "{fmt}"'}, status=400)
+    
+    if isinstance(request, ASGIRequest):
+        content = aiter_export(table, fmt)
+    else:
+        content = iter_export(table, fmt)
+    
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{table}.{fmt}"'
+    return response
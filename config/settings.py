@@ -55,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'authentication.middleware.CustomAuthMiddleware',
+    'authorization.middleware.PermissionMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -138,9 +139,98 @@ JWT_SECRET_KEY = SECRET_KEY
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+# Stateless mode: the middleware verifies the JWT signature and expiry locally
+# and uses the database only to check that the session was not revoked
+AUTH_STATELESS_JWT = False
+
+# Per-process LRU cache of authenticated sessions, disabled by default (size 0).
+# On its own it is per-worker: a logout, revocation or deactivation handled by
+# another worker is not seen here until the entry's TTL runs out. With
+# AUTH_SHARED_CACHE_ALIAS set, every local hit is checked against the shared
+# user/role versions. Rows changed outside the app are not seen by any cache
+AUTH_SESSION_CACHE_SIZE = 0
+AUTH_SESSION_CACHE_TTL = 60
+
+# Optional cross-worker session cache: name of an alias from CACHES
+# (locmem/file-based for tests, memcached or Redis in production)
+AUTH_SHARED_CACHE_ALIAS = None
+AUTH_SHARED_CACHE_TTL = 300
+
+# Password hashing: 'bcrypt' or 'argon2id' (argon2id needs the argon2-cffi package).
+# Hashes with another algorithm or cost are rehashed on the next successful login
+PASSWORD_HASHER = 'bcrypt'
+
 # Bcrypt settings
 BCRYPT_ROUNDS = 12
 
+# Argon2id settings (memory cost in KiB)
+ARGON2_TIME_COST = 3
+ARGON2_MEMORY_COST = 65536
+ARGON2_PARALLELISM = 4
+
+# Login password checks run in a bounded thread pool off the request thread;
+# when workers and queue are busy the login returns 503
+LOGIN_HASH_WORKERS = 4
+LOGIN_HASH_QUEUE_SIZE = 32
+
+# Login throttling per client IP and per email, checked before any user query
+# or password hashing. Token buckets live in process memory; set a CACHES
+# alias to share fixed-window counters between workers instead
+LOGIN_THROTTLE_RATES = {
+    'ip': '30/min',
+    'email': '10/min',
+}
+LOGIN_THROTTLE_CACHE_ALIAS = None
+LOGIN_THROTTLE_MAX_KEYS = 100000
+
+# RBAC policy cache: each worker compares the policy version at most once per
+# interval (seconds) and reloads the permission matrix only when it changed.
+# With a CACHES alias the version is read from the shared cache (entries live
+# RBAC_POLICY_CACHE_TTL seconds) instead of the database
+RBAC_POLICY_CHECK_INTERVAL = 1.0
+RBAC_POLICY_CACHE_ALIAS = None
+RBAC_POLICY_CACHE_TTL = 5
+
+# Policy snapshot written by `manage.py export_policy`. A worker loads it on
+# start instead of reading roles and rules from the database, as long as its
+# version matches the current policy version
+RBAC_POLICY_SNAPSHOT = os.getenv('RBAC_POLICY_SNAPSHOT') or None
+
+# Auth events (missing/invalid token, login, forbidden) are logged as JSON lines
+# to the 'authentication.events' logger. Events listed here are sampled with
+# the given probability, and every event type is capped at AUTH_EVENT_RATE_LIMIT
+AUTH_EVENT_SAMPLE_RATES = {
+    'missing_token': 0.01,
+    'invalid_token': 0.1,
+}
+AUTH_EVENT_RATE_LIMIT = '100/s'
+
+# The auth event handler only enqueues records; a background thread writes them
+# to stderr and records are dropped instead of blocking when the queue is full
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'authentication.log_handlers.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'auth_events': {
+            'class': 'authentication.log_handlers.NonBlockingHandler',
+            'formatter': 'json',
+            'queue_size': 10000,
+        },
+    },
+    'loggers': {
+        'authentication.events': {
+            'handlers': ['auth_events'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [],
@@ -16,10 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from authentication.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('authentication.urls')),
     path('api/admin/', include('authorization.urls')),
-    path('api/', include('mock_business.urls'))
+    path('api/', include('mock_business.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
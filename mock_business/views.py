@@ -1,7 +1,7 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from authorization.permissions import require_permission, PermissionChecker
+from authorization.permissions import require_permission, scope_to_owner, PermissionChecker
 
 
 # ============= Mock данные =============
@@ -24,11 +24,6 @@ MOCK_ORDERS = [
 
 # ============= Утилиты =============
 
-def filter_by_owner(items, user_id):
-    """Фильтрация объектов по владельцу"""
-    return [item for item in items if item.get('owner_id') == user_id]
-
-
 def get_item_by_id(items, item_id):
     """Получение объекта по ID"""
     for item in items:
@@ -47,11 +42,9 @@ def products_list_view(request):
     POST /api/products/ - создание товара
     """
     if request.method == 'GET':
-        products = MOCK_PRODUCTS.copy()
-        
-        # Если требуется фильтрация по owner (user видит только свои)
-        if request.requires_owner_filter:
-            products = filter_by_owner(products, request.user.id)
+        # Если требуется фильтрация по owner (user видит только свои),
+        # выбираются только его объекты, без копии всего списка
+        products = scope_to_owner(request, MOCK_PRODUCTS)
         
         return Response({
             'count': len(products),
@@ -123,11 +116,8 @@ def orders_list_view(request):
     POST /api/orders/ - создание заказа
     """
     if request.method == 'GET':
-        orders = MOCK_ORDERS.copy()
-        
         # Фильтрация по owner если требуется
-        if request.requires_owner_filter:
-            orders = filter_by_owner(orders, request.user.id)
+        orders = scope_to_owner(request, MOCK_ORDERS)
         
         return Response({
             'count': len(orders),